@@ -1,20 +1,46 @@
 import streamlit as st
 import time
 import os
+import tempfile
+import threading
+from resources import warm_up
 from utils.auth import hash_password, check_password
-from db import users_col, employees_col
-from cloud import upload_image_to_cloudinary
-from utils.face_utils import get_face_encodings
-import numpy as np
-from dotenv import load_dotenv
-from db import attendance_col
-import pandas as pd
-load_dotenv()
+from db import users_collection, tenant_collection, ensure_indexes, has_unique_index
+from pymongo.errors import DuplicateKeyError
+from utils.metrics import span, start_metrics_server
 
 st.set_page_config(page_title="FRA System")  # Set browser tab title
 
 SESSION_EXPIRY_MINUTES = 30
 
+# Start the recognition workers (and load their face models) at server start instead of on the first recognition
+WARM_UP_RECOGNITION = os.getenv("WARM_UP_RECOGNITION") == "1"
+
+def start_warm_up():
+    """Creates indexes, opens the Mongo pool and starts the background writers off the first page render."""
+    def run():
+        try:
+            ensure_indexes()
+            warm_up()
+            # Writes out attendance queued before a restart
+            from utils.attendance_queue import get_attendance_queue
+            get_attendance_queue()
+            # Copies photos still pending from before a restart to the remote store
+            from utils.enrollment import get_image_sync
+            get_image_sync()
+            if WARM_UP_RECOGNITION:
+                from utils.recognition_worker import get_recognition_pool
+                get_recognition_pool().warm_up()
+        except Exception as e:
+            print(f"[Warm-up Error]: {e}")
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+# Runs once per server process, not on every rerun
+st.cache_resource(start_warm_up)()
+if os.getenv("METRICS_PORT"):
+    st.cache_resource(start_metrics_server)(int(os.getenv("METRICS_PORT")))
+
 # Styled page title
 st.markdown("<h2 style='text-align: center;'>Face Recognition Attendance System</h2>", unsafe_allow_html=True)
 
@@ -36,6 +62,88 @@ def session_expired():
         return elapsed > SESSION_EXPIRY_MINUTES
     return False
 
+# ---------- ATTENDANCE HELPERS ----------
+def mark_attendance_from_image(image_file):
+    from concurrent.futures.process import BrokenProcessPool
+    from utils.recognition_worker import recognize, WorkerBusy
+    from datetime import datetime
+    from utils.attendance import TIMEZONE
+    from utils.attendance_queue import get_attendance_queue
+
+    org = st.session_state["organization"]
+
+    # Recognition runs in a worker process; this script thread only waits for it
+    try:
+        with span("recognition_wait"):
+            recognized = recognize(image_file.getvalue(), org)
+    except WorkerBusy:
+        st.warning("⏳ Too many recognitions in progress. Please try again in a moment.")
+        return
+    except TimeoutError:
+        st.error("❌ Recognition took too long. Please try again.")
+        return
+    except BrokenProcessPool:
+        st.error("❌ Face recognition is unavailable right now. Please try again shortly or contact your administrator.")
+        return
+
+    if recognized:
+        # Saved to the local queue and written to Mongo in the background:
+        # IN/OUT is decided there, in check-in order
+        now = datetime.now(TIMEZONE)
+        get_attendance_queue().enqueue([(emp, now) for emp in recognized], org)
+        names = sorted({emp["employee_name"] for emp in recognized})
+        st.success(f"✅ Check-in received for: {', '.join(names)}")
+    else:
+        st.warning("😐 No known faces recognized.")
+
+VIEWER_PAGE_SIZE = 50
+
+def render_attendance_viewer():
+    import pandas as pd
+    from utils.attendance import attendance_employee_names, find_attendance, daily_summary
+
+    org = st.session_state["organization"]
+    employee_names = attendance_employee_names(org)
+
+    if not employee_names:
+        st.info("No attendance records found yet.")
+        return
+
+    # Filters
+    employee_filter = st.selectbox("Filter by Employee", ["All"] + employee_names)
+    date_filter = st.date_input("Filter by Date", value=None)
+    view = st.radio("View", ["Logs", "Daily summary"], horizontal=True)
+
+    employee_name = None if employee_filter == "All" else employee_filter
+    date = date_filter.strftime("%Y-%m-%d") if date_filter else None
+
+    # Only the page being shown is fetched from MongoDB
+    page = st.number_input("Page", min_value=1, value=1, step=1) - 1
+    if view == "Logs":
+        rows, total = find_attendance(org, employee_name, date, page=page, page_size=VIEWER_PAGE_SIZE)
+    else:
+        rows, total = daily_summary(org, employee_name, date, page=page, page_size=VIEWER_PAGE_SIZE)
+
+    pages = max(1, -(-total // VIEWER_PAGE_SIZE))
+    st.dataframe(pd.DataFrame(rows))
+    st.caption(f"Page {page + 1} of {pages} ({total} rows)")
+
+    # Export (streamed to a temp file, built only on request)
+    export_format = st.selectbox("Export format", ["csv", "parquet"])
+    export_range = st.date_input("Export date range", value=(), help="Leave empty to export every date")
+    if st.button("Prepare export"):
+        from utils.export import export_attendance
+
+        start_date = end_date = date
+        if len(export_range) == 2:
+            start_date, end_date = (d.strftime("%Y-%m-%d") for d in export_range)
+
+        with tempfile.TemporaryFile() as out:
+            export_attendance(out, export_format, org, employee_name, start_date, end_date)
+            out.seek(0)
+            mime = "text/csv" if export_format == "csv" else "application/octet-stream"
+            st.download_button(f"📥 Download {export_format.upper()}", data=out.read(), file_name=f"attendance.{export_format}", mime=mime)
+
 # ---------- MAIN ----------
 if "logged_in" in st.session_state and st.session_state["logged_in"]:
     if session_expired():
@@ -104,7 +212,7 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
                     org = st.session_state["organization"]
                     username = st.session_state["username"]
 
-                    exists = employees_col.find_one({
+                    exists = tenant_collection(org, "employees").find_one({
                         "employee_id": emp_id,
                         "organization": org
                     })
@@ -112,46 +220,55 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
                     if exists:
                         st.error(f"❌ Employee ID '{emp_id}' already exists in your organization.")
                     else:
-                        from utils.face_utils import get_face_encodings
-
-                        encodings_list = []
-                        urls_list = []
+                        from utils.face_utils import add_employee_to_gallery
+                        from utils.enrollment import discard_photos, enroll_photos, queue_remote_copies
+                        from utils.encoding_store import pack_encodings
+                        from utils.templates import consolidate
+
+                        with span("enrollment"):
+                            enrollment = enroll_photos(valid_uploads)
+                        encodings_list = enrollment["encodings"]
+                        image_keys = enrollment["keys"]
                         failed_images = []
 
-                        for label, img in valid_uploads.items():
-                            cloud_name = f"{emp_name.replace(' ', '_')}_{label.replace(' ', '_')}"
-                            cloud_url = upload_image_to_cloudinary(img, cloud_name)
-
-                            if cloud_url:
-                                img.seek(0)
-                                encs = get_face_encodings(img)
-                                if encs:
-                                    encodings_list.append(encs[0].tolist())
-                                    urls_list.append(cloud_url)
-                                else:
-                                    failed_images.append(label)
+                        for label, reason in enrollment["failures"].items():
+                            if reason == "could not be stored":
+                                st.error(f"❌ Could not save the photo for {label}")
                             else:
-                                st.error(f"❌ Cloudinary upload failed for {label}")
+                                failed_images.append(f"{label} ({reason})")
 
                         if encodings_list:
-                            employees_col.insert_one({
+                            # Near-duplicate photos collapse into one template
+                            templates, centroid = consolidate(encodings_list)
+                            employee = {
                                 "employee_id": emp_id,
                                 "employee_name": emp_name,
                                 "organization": org,
                                 "uploaded_by": username,
-                                "image_urls": urls_list,
-                                "face_encodings": encodings_list
-                            })
+                                "image_keys": image_keys,  # local image store; image_urls fills in once copied to Cloudinary
+                                "image_urls": [],
+                                "face_encodings_blob": pack_encodings(templates),
+                                "face_centroid_blob": pack_encodings(centroid)
+                            }
+                            try:
+                                tenant_collection(org, "employees").insert_one(employee)
+                            except DuplicateKeyError:
+                                # Another admin saved the same ID while these photos were processed
+                                discard_photos(org, enrollment["new_keys"])
+                                st.error(f"❌ Employee ID '{emp_id}' already exists in your organization.")
+                            else:
+                                add_employee_to_gallery(org, employee)
+                                queue_remote_copies(org, emp_id, image_keys)
 
-                            st.session_state["upload_success"] = f"✅ Uploaded and saved {len(encodings_list)} valid photo(s) for '{emp_name}'."
-                            st.session_state["clear_emp_name"] = True
+                                st.session_state["upload_success"] = f"✅ Uploaded and saved {len(encodings_list)} valid photo(s) for '{emp_name}'."
+                                st.session_state["clear_emp_name"] = True
 
-                            if failed_images:
-                                st.warning(f"⚠️ No face detected in: {', '.join(failed_images)}")
+                                if failed_images:
+                                    st.warning(f"⚠️ Skipped: {', '.join(failed_images)}")
 
-                            st.experimental_rerun()
+                                st.experimental_rerun()
                         else:
-                            st.error("❌ No valid face found in any of the uploaded photos.")
+                            st.error(f"❌ No usable face in any of the uploaded photos: {', '.join(failed_images)}")
 
 
         # Add space
@@ -160,29 +277,7 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
         # Attendance Viewer
         st.subheader("📊 Attendance Viewer")
 
-        org = st.session_state["organization"]
-        records = list(attendance_col.find({"organization": org}))
-
-        if records:
-            df = pd.DataFrame(records)
-            df = df.drop(columns=["_id", "organization"])
-
-            # Filters
-            employee_filter = st.selectbox("Filter by Employee", ["All"] + sorted(df["employee_name"].unique().tolist()))
-            date_filter = st.date_input("Filter by Date", value=None)
-
-            if employee_filter != "All":
-                df = df[df["employee_name"] == employee_filter]
-            if date_filter:
-                df = df[df["date"] == date_filter.strftime("%Y-%m-%d")]
-
-            st.dataframe(df)
-
-            # CSV download
-            csv = df.to_csv(index=False).encode("utf-8")
-            st.download_button("📥 Download CSV", data=csv, file_name="attendance.csv", mime="text/csv")
-        else:
-            st.info("No attendance records found yet.")
+        render_attendance_viewer()
 
         st.write(f"Organization: `{st.session_state['organization']}`")
 
@@ -202,56 +297,7 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
                     if not uploaded_img:
                         st.warning("Please upload a photo with faces.")
                     else:
-                        from utils.face_utils import recognize_faces_from_image
-
-                        org = st.session_state["organization"]
-                        recognized_names = recognize_faces_from_image(uploaded_img, org)
-
-                        if recognized_names:
-                            from datetime import datetime
-                            import pytz
-                            india = pytz.timezone("Asia/Kolkata")
-                            now = datetime.now(india)
-
-                            marked_names = []
-                            skipped_names = []
-
-                            for name in recognized_names:
-                                employee = employees_col.find_one({"employee_name": name, "organization": org})
-                                if employee:
-                                    today = now.strftime("%Y-%m-%d")
-                                    existing_logs = list(attendance_col.find({
-                                        "employee_id": employee["employee_id"],
-                                        "organization": org,
-                                        "date": today
-                                    }).sort("time", 1))
-
-                                    if len(existing_logs) == 0:
-                                        attendance_type = "IN"
-                                    elif len(existing_logs) == 1:
-                                        attendance_type = "OUT"
-                                    else:
-                                        attendance_type = None
-
-                                    if attendance_type:
-                                        attendance_col.insert_one({
-                                            "employee_id": employee["employee_id"],
-                                            "employee_name": name,
-                                            "organization": org,
-                                            "date": today,
-                                            "time": now.strftime("%H:%M:%S"),
-                                            "type": attendance_type
-                                        })
-                                        marked_names.append(name)
-                                    else:
-                                        skipped_names.append(name)
-
-                            if marked_names:
-                                st.success(f"✅ Marked attendance for: {', '.join(marked_names)}")
-                            if skipped_names:
-                                st.info(f"⚠️ IN and OUT entries already marked for: {', '.join(skipped_names)}")
-                        else:
-                            st.warning("😐 No known faces recognized.")
+                        mark_attendance_from_image(uploaded_img)
 
         # --- Tab 2: Webcam Mode (Per Person) ---
         with tab2:
@@ -264,85 +310,14 @@ if "logged_in" in st.session_state and st.session_state["logged_in"]:
                     if not captured_image:
                         st.warning("Please capture a photo.")
                     else:
-                        from utils.face_utils import recognize_faces_from_image
-
-                        org = st.session_state["organization"]
-                        recognized_names = recognize_faces_from_image(captured_image, org)
-
-                        if recognized_names:
-                            from datetime import datetime
-                            import pytz
-                            india = pytz.timezone("Asia/Kolkata")
-                            now = datetime.now(india)
-
-                            marked_names = []
-                            skipped_names = []
-
-                            for name in recognized_names:
-                                employee = employees_col.find_one({"employee_name": name, "organization": org})
-                                if employee:
-                                    today = now.strftime("%Y-%m-%d")
-                                    existing_logs = list(attendance_col.find({
-                                        "employee_id": employee["employee_id"],
-                                        "organization": org,
-                                        "date": today
-                                    }).sort("time", 1))
-
-                                    if len(existing_logs) == 0:
-                                        attendance_type = "IN"
-                                    elif len(existing_logs) == 1:
-                                        attendance_type = "OUT"
-                                    else:
-                                        attendance_type = None
-
-                                    if attendance_type:
-                                        attendance_col.insert_one({
-                                            "employee_id": employee["employee_id"],
-                                            "employee_name": name,
-                                            "organization": org,
-                                            "date": today,
-                                            "time": now.strftime("%H:%M:%S"),
-                                            "type": attendance_type
-                                        })
-                                        marked_names.append(name)
-                                    else:
-                                        skipped_names.append(name)
-
-                            if marked_names:
-                                st.success(f"✅ Marked attendance for: {', '.join(marked_names)}")
-                            if skipped_names:
-                                st.info(f"⚠️ IN and OUT entries already marked for: {', '.join(skipped_names)}")
-                        else:
-                            st.warning("😐 No known faces recognized.")
+                        mark_attendance_from_image(captured_image)
 
         # Add space
         st.markdown("---\n\n\n")
         
         st.subheader("📊 Attendance Viewer")
 
-        org = st.session_state["organization"]
-        records = list(attendance_col.find({"organization": org}))
-
-        if records:
-            df = pd.DataFrame(records)
-            df = df.drop(columns=["_id", "organization"])
-
-            # Filters
-            employee_filter = st.selectbox("Filter by Employee", ["All"] + sorted(df["employee_name"].unique().tolist()))
-            date_filter = st.date_input("Filter by Date", value=None)
-
-            if employee_filter != "All":
-                df = df[df["employee_name"] == employee_filter]
-            if date_filter:
-                df = df[df["date"] == date_filter.strftime("%Y-%m-%d")]
-
-            st.dataframe(df)
-
-            # CSV download
-            csv = df.to_csv(index=False).encode("utf-8")
-            st.download_button("📥 Download CSV", data=csv, file_name="attendance.csv", mime="text/csv")
-        else:
-            st.info("No attendance records found yet.")
+        render_attendance_viewer()
         
         st.write(f"Organization: `{st.session_state['organization']}`")
 
@@ -363,18 +338,25 @@ else:
         if st.button("Register"):
             with st.spinner("Register process is going on..."):
                 if username and password and organization:
-                    if users_col.find_one({"username": username}):
+                    users = users_collection()
+                    # The unique index settles races; until it is confirmed to exist, check first
+                    checked = has_unique_index(users, [("username", 1)])
+                    if not checked and users.find_one({"username": username}, {"_id": 1}):
                         st.error("Username already exists.")
                     else:
-                        users_col.insert_one({
-                            "username": username,
-                            "password": hash_password(password),
-                            "role": role,
-                            "organization": organization
-                        })
-                        login_user(username, role, organization)
-                        st.success("Registered and logged in successfully!")
-                        st.rerun()
+                        try:
+                            users.insert_one({
+                                "username": username,
+                                "password": hash_password(password),
+                                "role": role,
+                                "organization": organization
+                            })
+                        except DuplicateKeyError:
+                            st.error("Username already exists.")
+                        else:
+                            login_user(username, role, organization)
+                            st.success("Registered and logged in successfully!")
+                            st.rerun()
                 else:
                     st.warning("Please fill in all fields.")
 
@@ -386,7 +368,7 @@ else:
 
         if st.button("Login"):
             with st.spinner("Login process is going on..."):
-                user = users_col.find_one({"username": username})
+                user = users_collection().find_one({"username": username})
                 if user and check_password(password, user["password"]):
                     login_user(user["username"], user["role"], user["organization"])
                     st.success("Login successful!")
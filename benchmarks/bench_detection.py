@@ -0,0 +1,94 @@
+"""Latency, peak RSS and agreement of downscaled face detection.
+
+Runs every image in a folder through the old full-resolution path
+(face_recognition.face_encodings on the whole image) and through
+utils.face_utils.encode_faces at several detection sizes. Each mode runs
+in its own process so peak RSS is measured separately. Agreement is the
+share of faces found at full resolution that have an encoding within
+--tolerance in the downscaled result. Needs face_recognition (dlib).
+
+Phone-sized inputs can be simulated from smaller samples with --upscale:
+
+    python -m benchmarks.bench_detection samples/ --upscale 4000 --max-edge 640 1280 1920
+"""
+import argparse
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def load_images(folder, upscale):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        img = Image.open(os.path.join(folder, name)).convert("RGB")
+        if upscale and max(img.size) < upscale:
+            factor = upscale / max(img.size)
+            img = img.resize((round(img.width * factor), round(img.height * factor)), Image.BICUBIC)
+        images.append((name, np.asarray(img)))
+    return images
+
+
+def run_mode(folder, upscale, max_edge):
+    """Encodes every image in one mode. Returns (seconds per image, peak RSS MiB, encodings per image)."""
+    import face_recognition
+    from utils.face_utils import encode_faces
+
+    images = load_images(folder, upscale)
+    results = []
+    start = time.perf_counter()
+    for _, image in images:
+        if max_edge is None:
+            encodings = face_recognition.face_encodings(image)
+        else:
+            encodings = encode_faces(image, max_edge=max_edge)
+        results.append(np.asarray(encodings).reshape(-1, 128))
+    elapsed = time.perf_counter() - start
+
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed / max(1, len(images)), peak_mib, results
+
+
+def agreement(reference, candidate, tolerance):
+    found = total = 0
+    for ref, cand in zip(reference, candidate):
+        total += len(ref)
+        if len(ref) and len(cand):
+            dists = np.linalg.norm(ref[:, None, :] - cand[None, :, :], axis=2)
+            found += int((dists.min(axis=1) <= tolerance).sum())
+    return found / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folder", help="folder of sample .jpg/.png images")
+    parser.add_argument("--max-edge", type=int, nargs="+", default=[640, 1024, 1280, 1920])
+    parser.add_argument("--upscale", type=int, default=0, help="upscale images to this long edge first")
+    parser.add_argument("--tolerance", type=float, default=0.4)
+    args = parser.parse_args()
+
+    modes = [None] + args.max_edge
+    print(f"{'mode':>12} {'s/image':>9} {'peak MiB':>9} {'faces':>6} {'agreement':>10}")
+
+    reference = None
+    for max_edge in modes:
+        # A fresh process per mode keeps ru_maxrss specific to that mode
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            per_image, peak_mib, results = pool.submit(run_mode, args.folder, args.upscale, max_edge).result()
+
+        if reference is None:
+            reference = results
+        name = "full-res" if max_edge is None else f"edge {max_edge}"
+        faces = sum(len(r) for r in results)
+        print(f"{name:>12} {per_image:>9.2f} {peak_mib:>9.0f} {faces:>6} {agreement(reference, results, args.tolerance):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Memory and throughput of the attendance export.
+
+Compares the streaming CSV/Parquet writers in utils.export with the old
+path (whole result in a DataFrame, then the whole CSV in memory). Rows
+come from a synthetic generator standing in for the Mongo cursor, so
+only the export itself is measured; peak memory is the peak of Python
+allocations reported by tracemalloc. Run from the repo root:
+
+    python -m benchmarks.bench_export --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from utils.export import write_csv, write_parquet
+
+
+def synthetic_records(rows, employees=3000):
+    for i in range(rows):
+        emp = i % employees
+        day = i // (employees * 2)
+        yield {
+            "employee_id": f"E{emp:05d}",
+            "employee_name": f"Employee {emp}",
+            "date": f"2024-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}",
+            "time": "09:00:00" if (i // employees) % 2 == 0 else "18:00:00",
+            "type": "IN" if (i // employees) % 2 == 0 else "OUT",
+        }
+
+
+def dataframe_export(records, out):
+    import pandas as pd
+
+    df = pd.DataFrame(list(records))
+    data = df.to_csv(index=False).encode("utf-8")
+    out.write(data)
+    return len(df)
+
+
+def measure(name, export, rows):
+    with tempfile.NamedTemporaryFile(delete=False) as out:
+        path = out.name
+        tracemalloc.start()
+        start = time.perf_counter()
+        written = export(synthetic_records(rows), out)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    size = os.path.getsize(path)
+    os.unlink(path)
+    print(f"{name:>12} {written:>10} {elapsed:>8.1f} {written / elapsed:>12.0f} {peak / 2**20:>10.1f} {size / 2**20:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-dataframe", action="store_true", help="skip the in-memory baseline")
+    args = parser.parse_args()
+
+    print(f"{'path':>12} {'rows':>10} {'seconds':>8} {'rows/s':>12} {'peak MiB':>10} {'file MiB':>9}")
+    measure("csv", write_csv, args.rows)
+    measure("parquet", write_parquet, args.rows)
+    if not args.skip_dataframe:
+        measure("dataframe", dataframe_export, args.rows)
+
+
+if __name__ == "__main__":
+    main()
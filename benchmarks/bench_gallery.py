@@ -0,0 +1,79 @@
+"""Latency of matching a group photo against galleries of increasing size.
+
+Compares the vectorized FaceGallery matcher with the old per-encoding loop
+(one compare call per known encoding). Run from the repo root:
+
+    python -m benchmarks.bench_gallery --faces 40 --photos 5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.gallery import FaceGallery
+
+
+def make_employees(n_employees, photos, rng):
+    employees = []
+    for i in range(n_employees):
+        base = rng.normal(0, 0.1, 128)
+        encs = base + rng.normal(0, 0.02, (photos, 128))
+        employees.append({
+            "employee_id": f"E{i:05d}",
+            "employee_name": f"Employee {i}",
+            "face_encodings": encs.tolist(),
+        })
+    return employees
+
+
+def loop_match(employees, unknown_encodings, tolerance):
+    # Same work as the original nested loop, with compare_faces inlined
+    recognized = []
+    for unknown in unknown_encodings:
+        for emp in employees:
+            for known in emp["face_encodings"]:
+                if np.linalg.norm(np.array([np.array(known)]) - unknown, axis=1)[0] <= tolerance:
+                    recognized.append(emp["employee_name"])
+                    break
+    return set(recognized)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 3000, 10000])
+    parser.add_argument("--photos", type=int, default=5)
+    parser.add_argument("--faces", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--loop-limit", type=int, default=1000, help="skip the slow loop above this many employees")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'employees':>10} {'encodings':>10} {'build ms':>10} {'match ms':>10} {'loop ms':>10}")
+
+    for size in args.sizes:
+        employees = make_employees(size, args.photos, rng)
+        probes = [np.array(employees[i]["face_encodings"][0]) + rng.normal(0, 0.01, 128)
+                  for i in rng.choice(size, min(args.faces, size), replace=False)]
+
+        build_s, gallery = timed(lambda: FaceGallery.from_employees(employees), args.repeat)
+        match_s, _ = timed(lambda: gallery.match(probes), args.repeat)
+
+        loop_ms = "-"
+        if size <= args.loop_limit:
+            loop_s, _ = timed(lambda: loop_match(employees, probes, 0.4), 1)
+            loop_ms = f"{loop_s * 1000:.1f}"
+
+        print(f"{size:>10} {len(gallery):>10} {build_s * 1000:>10.1f} {match_s * 1000:>10.2f} {loop_ms:>10}")
+
+
+if __name__ == "__main__":
+    main()
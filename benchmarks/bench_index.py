@@ -0,0 +1,80 @@
+"""Recall and latency of the IVF face index against exact search.
+
+Recall is the fraction of probe faces whose nearest employee under the IVF
+index is the same as under exact brute force. --spread sets how far apart
+employees are: the default puts a typical pair about 0.64 apart, as dlib
+encodings of different people are, so neighbours sit near the 0.4-0.6
+match tolerance and n_probe actually trades recall. Run from the repo root:
+
+    python -m benchmarks.bench_index --employees 20000 --photos 5 --spread 0.04
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.face_index import ExactIndex, IVFIndex
+
+
+def make_gallery(n_employees, photos, rng, spread=0.04, noise=0.02):
+    """Encodings of n_employees x photos faces.
+
+    Employees are normal(0, spread) per dimension, so two of them are about
+    spread * 16 apart (sqrt(2 * 128)); photos of one employee add
+    normal(0, noise), about noise * 16 between two photos.
+    """
+    base = rng.normal(0, spread, (n_employees, 128)).astype(np.float32)
+    vectors = np.repeat(base, photos, axis=0) + rng.normal(0, noise, (n_employees * photos, 128)).astype(np.float32)
+    owners = np.repeat(np.arange(n_employees), photos)
+    return vectors, owners
+
+
+def timed_search(index, probes, batch):
+    rows = []
+    start = time.perf_counter()
+    for i in range(0, len(probes), batch):
+        rows.append(index.search(probes[i:i + batch], k=1)[1][:, 0])
+    elapsed = time.perf_counter() - start
+    return elapsed / len(probes), np.concatenate(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=20000)
+    parser.add_argument("--photos", type=int, default=5)
+    parser.add_argument("--probes", type=int, default=400)
+    parser.add_argument("--batch", type=int, default=40, help="faces per recognition call")
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--spread", type=float, default=0.04, help="per-dimension spread of employees")
+    parser.add_argument("--noise", type=float, default=0.02, help="per-dimension spread of one employee's photos")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors, owners = make_gallery(args.employees, args.photos, rng, args.spread, args.noise)
+    targets = rng.choice(len(vectors), args.probes, replace=False)
+    probes = vectors[targets] + rng.normal(0, args.noise, (args.probes, 128)).astype(np.float32)
+
+    exact = ExactIndex.build(vectors)
+    exact_s, exact_rows = timed_search(exact, probes, args.batch)
+    exact_owners = owners[exact_rows]
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(vectors, n_lists=args.n_lists)
+    build_s = time.perf_counter() - start
+
+    print(f"gallery: {len(vectors)} encodings, {len(ivf.centroids)} lists (built in {build_s:.1f}s), "
+          f"employees ~{args.spread * 16:.2f} apart, photos ~{args.noise * 16:.2f}")
+    print(f"{'backend':>10} {'n_probe':>8} {'recall@1':>9} {'ms/face':>9} {'speedup':>8}")
+    print(f"{'exact':>10} {'-':>8} {1.0:>9.3f} {exact_s * 1000:>9.3f} {1.0:>8.1f}")
+
+    for n_probe in args.n_probe:
+        ivf.n_probe = n_probe
+        ivf_s, ivf_rows = timed_search(ivf, probes, args.batch)
+        found = ivf_rows >= 0
+        recall = np.mean(found & (owners[np.where(found, ivf_rows, 0)] == exact_owners))
+        print(f"{'ivf':>10} {n_probe:>8} {recall:>9.3f} {ivf_s * 1000:>9.3f} {exact_s / ivf_s:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Start-up and rerun cost of the Streamlit app.
+
+Runs app.py headless with Streamlit's AppTest, against mongomock and the
+stub face detector, each scenario in a fresh interpreter so imports and
+clients are cold:
+
+- login page: the first run of a new server process, then reruns (every
+  widget interaction re-executes app.py)
+- admin dashboard: the same, for a logged-in admin
+- enrollment imports: importing the modules Save Images needs
+
+After each scenario it reports which heavy modules the process had
+loaded. --model-load simulates dlib's model loading in the stub
+(seconds per import). Run from the repo root on two revisions to compare:
+
+    python -m benchmarks.bench_startup --model-load 1.5
+"""
+import argparse
+import builtins
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["face_recognition", "pandas", "cloudinary", "pytz", "utils.face_utils"]
+
+
+def timed_script_runs():
+    """Records how long each execution of the app script takes.
+
+    AppTest.run() polls for the script to finish, so its wall time is
+    mostly sleeping; this times the exec() of app.py itself instead.
+    """
+    from streamlit.runtime.scriptrunner import script_runner
+
+    durations = []
+
+    def timed_exec(code, *args):
+        start = time.perf_counter()
+        try:
+            builtins.exec(code, *args)
+        finally:
+            durations.append(time.perf_counter() - start)
+
+    script_runner.exec = timed_exec
+    return durations
+
+
+def run_app(args, session_state):
+    from streamlit.testing.v1 import AppTest
+
+    durations = timed_script_runs()
+    at = AppTest.from_file("app.py", default_timeout=60)
+    for key, value in session_state.items():
+        at.session_state[key] = value
+
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    for _ in range(args.reruns):
+        at.run()
+    return {"first_ms": durations[0] * 1000, "rerun_ms": statistics.median(durations[1:]) * 1000}
+
+
+def child(args):
+    from benchmarks import harness
+
+    harness.FaceStub.load_seconds = args.model_load
+    harness.install()
+    import streamlit  # noqa: F401  (paid by the server, not by app.py)
+
+    if args.child == "login":
+        result = run_app(args, {})
+    elif args.child == "admin":
+        result = run_app(args, {
+            "logged_in": True, "username": "bench", "role": "admin",
+            "organization": "bench-org", "login_time": time.time(),
+        })
+    else:
+        start = time.perf_counter()
+        import utils.enrollment  # noqa: F401
+        from utils.face_utils import add_employee_to_gallery  # noqa: F401
+        from utils.encoding_store import pack_encodings  # noqa: F401
+        result = {"first_ms": (time.perf_counter() - start) * 1000}
+
+    result["loaded"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per scenario")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--model-load", type=float, default=0.0, help="simulated face model load seconds")
+    parser.add_argument("--child", choices=["login", "admin", "enrollment"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    print(f"{'scenario':<12} {'first run':>12} {'rerun':>10}  loaded")
+    for scenario in ["login", "admin", "enrollment"]:
+        results = []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child", scenario,
+                 "--reruns", str(args.reruns), "--model-load", str(args.model_load)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+        first = statistics.median(r["first_ms"] for r in results)
+        rerun = statistics.median(r["rerun_ms"] for r in results) if "rerun_ms" in results[0] else None
+        rerun_text = f"{rerun:8.1f}ms" if rerun is not None else f"{'-':>10}"
+        print(f"{scenario:<12} {first:10.1f}ms {rerun_text}  {', '.join(results[0]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Frames per second of streaming recognition on a recorded clip.
+
+Compares a full detect-and-encode pass on every frame (what one webcam
+capture costs today) with StreamingRecognizer at several detection
+intervals. Frames are decoded up front so only recognition is timed.
+Needs face_recognition and opencv-python, plus MongoDB for the gallery:
+
+    python -m benchmarks.bench_streaming gate.mp4 --org acme --detect-every 1 3 5 10
+"""
+import argparse
+import time
+
+from utils.face_utils import encode_faces, get_gallery
+from utils.streaming import StreamingRecognizer, video_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("video", help="recorded clip")
+    parser.add_argument("--org", required=True)
+    parser.add_argument("--frames", type=int, default=300, help="use at most this many frames")
+    parser.add_argument("--detect-every", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--max-edge", type=int, default=640)
+    args = parser.parse_args()
+
+    frames = []
+    for frame in video_frames(args.video):
+        frames.append(frame)
+        if len(frames) >= args.frames:
+            break
+
+    gallery = get_gallery(args.org)  # load once so it is not timed
+    print(f"{len(frames)} frames, gallery of {len(gallery)} encodings")
+    print(f"{'mode':>16} {'fps':>8} {'encodings':>10} {'events':>7}")
+
+    start = time.perf_counter()
+    encodings = 0
+    for frame in frames:
+        found = encode_faces(frame, max_edge=args.max_edge)
+        gallery.match(found)
+        encodings += len(found)
+    print(f"{'every frame':>16} {len(frames) / (time.perf_counter() - start):>8.1f} {encodings:>10} {'-':>7}")
+
+    for every in args.detect_every:
+        recognizer = StreamingRecognizer(args.org, detect_every=every, max_edge=args.max_edge)
+        start = time.perf_counter()
+        events = sum(1 for _ in recognizer.run(frames))
+        fps = len(frames) / (time.perf_counter() - start)
+        print(f"{f'detect every {every}':>16} {fps:>8.1f} {recognizer.stats['encodings']:>10} {events:>7}")
+
+
+if __name__ == "__main__":
+    main()
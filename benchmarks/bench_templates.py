@@ -0,0 +1,88 @@
+"""Gallery size, match latency and accuracy before and after template consolidation.
+
+Synthetic employees are enrolled over and over: each has a few looks
+(e.g. with and without glasses) and many near-duplicate encodings of
+each. The same probes are matched against the raw gallery, the
+consolidated one (utils.templates), and the consolidated one with
+centroid screening. Run from the repo root:
+
+    python -m benchmarks.bench_templates --employees 2000 --per-employee 30
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.encoding_store import pack_encodings
+from utils.gallery import FaceGallery
+from utils.templates import consolidate
+
+
+def synthetic_history(n_employees, per_employee, looks, rng):
+    """(employees x per_employee x 128) encodings: `looks` modes per person, near-duplicates around each."""
+    base = rng.normal(0, 0.05, (n_employees, 1, 1, 128))
+    modes = base + rng.normal(0, 0.02, (n_employees, 1, looks, 128))
+    picks = rng.integers(0, looks, (n_employees, per_employee))
+    chosen = np.take_along_axis(modes[:, 0], picks[:, :, None], axis=1)
+    return (chosen + rng.normal(0, 0.01, chosen.shape)).astype(np.float32), modes[:, 0]
+
+
+def timed_match(gallery, probes, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matches = gallery.match(probes, tolerance=0.4)
+        samples.append(time.perf_counter() - start)
+    return np.median(samples), matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--per-employee", type=int, default=30, help="encodings collected per employee")
+    parser.add_argument("--looks", type=int, default=3)
+    parser.add_argument("--max-templates", type=int, default=5)
+    parser.add_argument("--screen", type=int, default=8, help="employees shortlisted by centroid")
+    parser.add_argument("--faces", type=int, default=40, help="probes per match call")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    history, modes = synthetic_history(args.employees, args.per_employee, args.looks, rng)
+    employees = [{"employee_id": f"E{i:06d}", "employee_name": f"Employee {i}"} for i in range(args.employees)]
+
+    start = time.perf_counter()
+    consolidated = [consolidate(encs, args.max_templates) for encs in history]
+    consolidate_s = time.perf_counter() - start
+
+    raw_docs = [{**emp, "face_encodings_blob": pack_encodings(encs)} for emp, encs in zip(employees, history)]
+    consolidated_docs = [
+        {**emp, "face_encodings_blob": pack_encodings(templates), "face_centroid_blob": pack_encodings(centroid)}
+        for emp, (templates, centroid) in zip(employees, consolidated)
+    ]
+
+    # Genuine probes: a new photo of a known look. Impostors: people never enrolled
+    who = rng.choice(args.employees, args.faces, replace=False)
+    look = rng.integers(0, args.looks, args.faces)
+    genuine = (modes[who, look] + rng.normal(0, 0.012, (args.faces, 128))).astype(np.float32)
+    impostors = (rng.normal(0, 0.05, (args.faces, 128)) + rng.normal(0, 0.02, (args.faces, 128))).astype(np.float32)
+    expected = [employees[i]["employee_id"] for i in who]
+
+    print(f"{args.employees} employees, {args.per_employee} encodings each; consolidation took {consolidate_s:.2f}s\n")
+    print(f"{'gallery':<28} {'rows':>8} {'MB':>7} {'match p50':>11} {'correct':>8} {'false acc.':>11}")
+    variants = [
+        ("raw", FaceGallery.from_employees(raw_docs)),
+        ("consolidated", FaceGallery.from_employees(consolidated_docs)),
+        (f"consolidated + screen {args.screen}", FaceGallery.from_employees(consolidated_docs, screen=args.screen)),
+    ]
+    for name, gallery in variants:
+        seconds, matches = timed_match(gallery, genuine, args.repeat)
+        correct = sum(emp is not None and emp["employee_id"] == e for (emp, _), e in zip(matches, expected))
+        false_accepts = sum(emp is not None for emp, _ in gallery.match(impostors, tolerance=0.4))
+        print(f"{name:<28} {len(gallery):>8} {gallery.encodings.nbytes / 2**20:>7.1f} {seconds * 1000:>9.2f}ms "
+              f"{correct:>4}/{args.faces} {false_accepts:>7}/{args.faces}")
+
+
+if __name__ == "__main__":
+    main()
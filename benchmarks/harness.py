@@ -0,0 +1,106 @@
+"""Local stand-ins for benchmarks: mongomock instead of MongoDB, and a stub
+face_recognition whose "detections" are encodings registered up front.
+
+install() must run before db or anything under utils is imported.
+"""
+import importlib.abc
+import importlib.util
+import io
+import os
+import sys
+import time
+import types
+
+import numpy as np
+from PIL import Image
+
+
+def install(mongo_uri=None, stub_faces=True):
+    """Points db at mongomock (or at mongo_uri when given) and optionally stubs face_recognition."""
+    if "db" in sys.modules:
+        raise RuntimeError("benchmarks.harness.install() must run before db is imported")
+
+    os.environ.setdefault("MONGO_DB", "fra_bench")
+    if mongo_uri:
+        os.environ["MONGO_URI"] = mongo_uri
+    else:
+        import mongomock
+        import pymongo
+
+        client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *args, **kwargs: client
+
+    if stub_faces:
+        # Installed as an import hook, so "face_recognition" in sys.modules
+        # still tells whether the code under test imported it
+        sys.meta_path.insert(0, _StubFinder())
+
+
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def find_spec(self, name, path, target=None):
+        if name == "face_recognition":
+            return importlib.util.spec_from_loader(name, self)
+        return None
+
+    def create_module(self, spec):
+        return FaceStub.module()
+
+    def exec_module(self, module):
+        pass
+
+
+class FaceStub:
+    """Fake face_recognition: an image's pixel (0, 0) holds an id into a registry of encodings.
+
+    Images still go through PIL decoding and the real detection/matching
+    code; only dlib's detector and encoder are replaced.
+    """
+
+    registry = {}
+    load_seconds = 0.0  # simulated model loading on import, like dlib's
+
+    @classmethod
+    def image_for(cls, encodings, size=64, textured=False):
+        """Returns PNG bytes whose faces will "encode" to the given encodings.
+
+        textured fills the image with noise so it passes enrollment's
+        sharpness check (use a size of at least MIN_ENROLL_FACE too).
+        """
+        image_id = len(cls.registry) + 1
+        cls.registry[image_id] = [np.asarray(e, dtype=np.float64) for e in encodings]
+        if textured:
+            pixels = np.random.default_rng(image_id).integers(0, 256, (size, size, 3), dtype=np.uint8)
+        else:
+            pixels = np.zeros((size, size, 3), dtype=np.uint8)
+        pixels[0, 0] = (image_id >> 16 & 255, image_id >> 8 & 255, image_id & 255)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, format="PNG")
+        return buf.getvalue()
+
+    @classmethod
+    def _encodings(cls, image):
+        r, g, b = (int(v) for v in image[0, 0])
+        return cls.registry.get(r << 16 | g << 8 | b, [])
+
+    @classmethod
+    def module(cls):
+        time.sleep(cls.load_seconds)
+        module = types.ModuleType("face_recognition")
+
+        def face_locations(image, number_of_times_to_upsample=1, model="hog"):
+            h, w = image.shape[:2]
+            return [(0, w, h, 0)] * len(cls._encodings(image))
+
+        def face_encodings(image, known_face_locations=None, num_jitters=1, model="small"):
+            encodings = cls._encodings(image)
+            if known_face_locations is not None:
+                encodings = encodings[:len(known_face_locations)]
+            return list(encodings)
+
+        def load_image_file(file, mode="RGB"):
+            return np.array(Image.open(file).convert(mode))
+
+        module.face_locations = face_locations
+        module.face_encodings = face_encodings
+        module.load_image_file = load_image_file
+        return module
@@ -0,0 +1,147 @@
+"""Burst load test for attendance marking: synchronous writes vs the local queue.
+
+Simulates a shift change: N clerks submit check-ins at once, each sending
+its next submission as soon as the previous one is acknowledged. Some
+employees are photographed by two clerks a few seconds apart. The same
+burst is run with the synchronous path (mark_attendance, two Mongo round
+trips per submission) and with the queue (utils.attendance_queue), then
+the attendance collection is checked for duplicate slots and for
+double check-ins recorded as an IN plus a spurious OUT. Mongo is
+mongomock with a simulated round trip; run from the repo root:
+
+    python -m benchmarks.load_attendance --clerks 24 --submissions 20 --rtt-ms 2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks import harness
+
+harness.install()
+
+import utils.attendance as attendance  # noqa: E402
+from db import tenant_collection  # noqa: E402
+from utils.attendance import TIMEZONE, mark_attendance  # noqa: E402
+from utils.attendance_queue import AttendanceQueue  # noqa: E402
+
+
+class SlowCollection:
+    """Adds a network round trip to every call, like a remote MongoDB."""
+
+    def __init__(self, collection, rtt):
+        self._collection = collection
+        self._rtt = rtt
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._rtt)
+            return attr(*args, **kwargs)
+        return call
+
+
+def burst_plan(args, rng):
+    """Per clerk, a list of submissions: (employees, timestamp)."""
+    employees = [{"employee_id": f"E{i:06d}", "employee_name": f"Employee {i}"} for i in range(args.employees)]
+    start = TIMEZONE.localize(datetime(2030, 1, 1, 8, 55))
+    order = rng.permutation(args.employees)
+    plan = [[] for _ in range(args.clerks)]
+    taken = 0
+    for s in range(args.submissions):
+        for c in range(args.clerks):
+            group = [employees[i] for i in order[taken:taken + args.group]]
+            taken = (taken + args.group) % args.employees
+            # Someone already checked in walks past another clerk's camera
+            if rng.random() < args.repeat_rate and taken > args.group * 2:
+                group.append(employees[order[taken - args.group * 2]])
+            plan[c].append((group, start + timedelta(seconds=s * 2 + int(rng.integers(0, 2)))))
+    return plan
+
+
+def run_burst(plan, submit):
+    latencies = []
+    lock = threading.Lock()
+
+    def clerk(submissions):
+        for group, when in submissions:
+            start = time.perf_counter()
+            submit(group, when)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=clerk, args=(submissions,)) for submissions in plan]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+def check(organization):
+    """Returns (entries, duplicate slots, employees with more than one entry)."""
+    col = tenant_collection(organization, "attendance")
+    docs = list(col.find({"organization": organization}, {"employee_id": 1, "date": 1, "type": 1}))
+    slots = {(d["employee_id"], d["date"], d["type"]) for d in docs}
+    per_employee = {}
+    for d in docs:
+        per_employee[(d["employee_id"], d["date"])] = per_employee.get((d["employee_id"], d["date"]), 0) + 1
+    return len(docs), len(docs) - len(slots), sum(n > 1 for n in per_employee.values())
+
+
+def report(name, latencies, acked, stored, submissions, organization):
+    """acked: seconds until every submission was acknowledged; stored: until all of it was in Mongo."""
+    entries, duplicate_slots, double = check(organization)
+    ms = np.array(latencies) * 1000
+    print(f"{name:<8} {np.percentile(ms, 50):>8.2f}ms {np.percentile(ms, 95):>8.2f}ms {acked:>8.2f}s {stored:>8.2f}s "
+          f"{submissions / stored:>9.0f}/s {entries:>8} {duplicate_slots:>10} {double:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clerks", type=int, default=24)
+    parser.add_argument("--submissions", type=int, default=20, help="submissions per clerk")
+    parser.add_argument("--group", type=int, default=2, help="faces per submission")
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--repeat-rate", type=float, default=0.2, help="share of submissions that re-photograph someone")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="simulated Mongo round trip")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    plan = burst_plan(args, np.random.default_rng(args.seed))
+    submissions = args.clerks * args.submissions
+    real_collection = attendance.tenant_collection
+    attendance.tenant_collection = lambda org, name: SlowCollection(real_collection(org, name), args.rtt_ms / 1000)
+
+    print(f"{args.clerks} clerks x {args.submissions} submissions, {args.group} faces each, "
+          f"Mongo round trip {args.rtt_ms:g}ms\n")
+    print(f"{'path':<8} {'ack p50':>10} {'ack p95':>10} {'all acked':>9} {'in Mongo':>9} {'throughput':>11} "
+          f"{'entries':>8} {'dup. slots':>10} {'double marks':>12}")
+
+    latencies, seconds = run_burst(plan, lambda group, when: mark_attendance(group, "burst-sync", now=when))
+    report("sync", latencies, seconds, seconds, submissions, "burst-sync")
+
+    root = tempfile.mkdtemp(prefix="fra-bench-queue-")
+    queue = AttendanceQueue(os.path.join(root, "attendance.sqlite3")).start()
+    start = time.perf_counter()
+    latencies, acked = run_burst(plan, lambda group, when: queue.enqueue([(emp, when) for emp in group], "burst-queued"))
+    queue.drain()
+    stored = time.perf_counter() - start
+    queue.stop()
+    report("queued", latencies, acked, stored, submissions, "burst-queued")
+    print(f"\nqueue: {queue.stats['flushes']} flushes, {queue.stats['marked']} marked, "
+          f"{queue.stats['coalesced']} coalesced, {queue.stats['skipped']} skipped")
+    shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
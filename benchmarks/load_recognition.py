@@ -0,0 +1,93 @@
+"""Load test for the recognition worker pool.
+
+Simulates N clerks submitting images at the same time, each sending its
+next image as soon as the previous one is answered, and reports p50/p95
+latency, throughput and how many submissions were rejected by
+backpressure. Images come from a folder, or are random noise JPEGs
+(no faces, so only decoding and detection are exercised). Run from the
+repo root with MongoDB configured:
+
+    python -m benchmarks.load_recognition --clerks 8 --requests 10 --images samples/ --org acme
+"""
+import argparse
+import io
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.recognition_worker import RecognitionPool, WorkerBusy
+
+
+def load_images(folder, count, size):
+    if folder:
+        names = sorted(n for n in os.listdir(folder) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        return [open(os.path.join(folder, n), "rb").read() for n in names]
+
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (size, size * 4 // 3, 3), dtype=np.uint8)).save(buf, format="JPEG")
+        images.append(buf.getvalue())
+    return images
+
+
+def clerk(pool, images, requests, organization, latencies, rejected, lock):
+    for i in range(requests):
+        image = images[i % len(images)]
+        start = time.perf_counter()
+        try:
+            pool.recognize(image, organization)
+        except (WorkerBusy, TimeoutError):
+            with lock:
+                rejected.append(1)
+            time.sleep(0.1)  # a clerk retries a moment later
+            continue
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clerks", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="submissions per clerk")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--images", help="folder of test images (default: random noise)")
+    parser.add_argument("--size", type=int, default=960, help="height of generated noise images")
+    parser.add_argument("--org", default="load-test-org")
+    args = parser.parse_args()
+
+    images = load_images(args.images, 4, args.size)
+    pool = RecognitionPool(workers=args.workers, max_pending=args.max_pending, timeout=args.timeout)
+
+    # Every worker loads its models and the gallery before the clock starts
+    pool.warm_up(images[0], args.org, wait=True)
+
+    latencies, rejected, lock = [], [], threading.Lock()
+    threads = [
+        threading.Thread(target=clerk, args=(pool, images, args.requests, args.org, latencies, rejected, lock))
+        for _ in range(args.clerks)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+
+    if latencies:
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"clerks={args.clerks} completed={len(latencies)} rejected={len(rejected)} "
+              f"p50={p50 * 1000:.0f}ms p95={p95 * 1000:.0f}ms throughput={len(latencies) / elapsed:.1f}/s")
+    else:
+        print(f"No request completed ({len(rejected)} rejected)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""End-to-end benchmark suite on synthetic tenants.
+
+Times enrollment, recognition at several gallery sizes, attendance
+marking and Attendance Viewer queries, using mongomock (or a real mongod
+with --mongo-uri) and a stub face detector, so matching and database
+paths are measured in isolation. Results are written as JSON; pass a
+previous results file with --compare to see regressions. Run from the
+repo root:
+
+    python -m benchmarks.run_suite --out results.json
+    python -m benchmarks.run_suite --out new.json --compare results.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks import harness
+
+
+class Recorder:
+    def __init__(self):
+        self.results = []
+
+    def measure(self, name, fn, repeat=5, setup=None, **params):
+        """Times fn() `repeat` times (setup() runs untimed before each call) and records the samples."""
+        samples = []
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+
+        result = {
+            "name": name,
+            "params": params,
+            "samples_ms": [s * 1000 for s in samples],
+            "p50_ms": float(np.percentile(samples, 50) * 1000),
+            "p95_ms": float(np.percentile(samples, 95) * 1000),
+        }
+        self.results.append(result)
+        shown = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:<32} {shown:<28} p50={result['p50_ms']:9.2f}ms p95={result['p95_ms']:9.2f}ms")
+        return result
+
+
+def bench_enrollment(rec, args, rng):
+    from db import tenant_collection
+    from utils.enrollment import _record_remote_url, enroll_photos, queue_remote_copies
+    from utils.encoding_store import pack_encodings
+    from utils.face_utils import add_employee_to_gallery
+    from utils.image_store import LocalImageStore, LocalRemote, RemoteSync
+    from utils.templates import consolidate
+    from benchmarks.synthetic import employee_encodings
+
+    org = "bench-enroll"
+    encodings = employee_encodings(args.enroll_employees, args.photos, rng)
+    photos = [
+        {f"Photo {p}": harness.FaceStub.image_for([encs[p]], size=160, textured=True) for p in range(args.photos)}
+        for encs in encodings
+    ]
+    counter = iter(range(len(photos)))
+
+    # Local image store, with a remote that takes upload_latency per photo
+    root = tempfile.mkdtemp(prefix="fra-bench-images-")
+    store = LocalImageStore(os.path.join(root, "store"))
+    image_sync = RemoteSync(store, LocalRemote(os.path.join(root, "remote"), latency=args.upload_latency),
+                            on_synced=_record_remote_url).start()
+    pool = ThreadPoolExecutor(args.photos)  # the stub encoder is not importable from spawned processes
+
+    def enroll_one():
+        i = next(counter)
+        result = enroll_photos(photos[i], store=store, encode_pool=pool)
+        if result["failures"]:
+            raise RuntimeError(f"Enrollment photos rejected: {result['failures']}")
+        templates, centroid = consolidate(result["encodings"])
+        employee = {
+            "employee_id": f"E{i:06d}",
+            "employee_name": f"Employee {i}",
+            "organization": org,
+            "image_keys": result["keys"],
+            "image_urls": [],
+            "face_encodings_blob": pack_encodings(templates),
+            "face_centroid_blob": pack_encodings(centroid),
+        }
+        tenant_collection(org, "employees").insert_one(employee)
+        add_employee_to_gallery(org, employee)
+        queue_remote_copies(org, employee["employee_id"], result["keys"], image_sync=image_sync)
+
+    rec.measure("enrollment", enroll_one, repeat=args.enroll_employees, photos=args.photos, upload_ms=args.upload_latency * 1000)
+    rec.measure("enrollment: remote copies drained", image_sync.drain, repeat=1,
+                photos=args.enroll_employees * args.photos, upload_ms=args.upload_latency * 1000)
+    image_sync.stop()
+    pool.shutdown()
+    shutil.rmtree(root)
+
+
+def bench_recognition(rec, args, rng):
+    from db import tenant_collection
+    from utils import face_utils
+    from benchmarks.synthetic import probe_encodings, synthetic_employees
+
+    for size in args.sizes:
+        org = f"bench-{size}"
+        docs, encodings = synthetic_employees(org, size, args.photos, rng)
+        tenant_collection(org, "employees").insert_many(docs)
+
+        rec.measure("gallery load (cold)", lambda: face_utils.get_gallery(org),
+                    setup=lambda: face_utils.invalidate_gallery(org), repeat=3, employees=size)
+
+        for faces in args.faces:
+            probes, _ = probe_encodings(encodings, faces, rng)
+            image = harness.FaceStub.image_for(probes)
+
+            def clear_caches():
+                face_utils.encoding_cache._cache.clear()
+                face_utils.recent_matches.invalidate(org)
+
+            rec.measure("recognition (uncached)", lambda: face_utils.match_faces_from_image(image, org),
+                        setup=clear_caches, repeat=args.repeat, employees=size, faces=faces)
+            rec.measure("recognition (resubmitted)", lambda: face_utils.match_faces_from_image(image, org),
+                        repeat=args.repeat, employees=size, faces=faces)
+
+
+def bench_attendance(rec, args, rng):
+    from utils.attendance import TIMEZONE, mark_attendance
+
+    org = f"bench-{args.sizes[0]}"
+    employees = [{"employee_id": f"E{i:06d}", "employee_name": f"Employee {i}"} for i in range(args.sizes[0])]
+    day = iter(range(10_000))
+
+    for group in args.faces:
+        group = min(group, len(employees))
+
+        def mark():
+            # A fresh date every round so every entry is a real IN
+            now = TIMEZONE.localize(datetime(2030, 1, 1, 9) + timedelta(days=next(day)))
+            picks = rng.choice(len(employees), group, replace=False)
+            mark_attendance([employees[i] for i in picks], org, now=now)
+
+        rec.measure("attendance marking", mark, repeat=args.repeat, group=group)
+
+
+def bench_viewer(rec, args, rng):
+    from db import tenant_collection
+    from utils.attendance import daily_summary, find_attendance
+    from utils.export import export_attendance
+    from benchmarks.synthetic import synthetic_attendance
+
+    org = "bench-history"
+    employees = [{"employee_id": f"E{i:06d}", "employee_name": f"Employee {i}"} for i in range(args.history_employees)]
+    attendance_col = tenant_collection(org, "attendance")
+    batch = []
+    for doc in synthetic_attendance(org, employees, args.history_days, rng=rng):
+        batch.append(doc)
+        if len(batch) == 10_000:
+            attendance_col.insert_many(batch)
+            batch = []
+    if batch:
+        attendance_col.insert_many(batch)
+    rows = attendance_col.count_documents({"organization": org})
+
+    rec.measure("viewer: first page", lambda: find_attendance(org), repeat=args.repeat, rows=rows)
+    rec.measure("viewer: page 20", lambda: find_attendance(org, page=20), repeat=args.repeat, rows=rows)
+    rec.measure("viewer: one employee", lambda: find_attendance(org, employee_name="Employee 7"), repeat=args.repeat, rows=rows)
+    rec.measure("viewer: daily summary", lambda: daily_summary(org), repeat=args.repeat, rows=rows)
+    rec.measure("export: one month csv",
+                lambda: export_attendance(io.BytesIO(), "csv", org, start_date="2024-01-01", end_date="2024-01-31"),
+                repeat=max(1, args.repeat // 5), rows=rows)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_path} (p50):")
+    for r in results:
+        old = baseline.get((r["name"], json.dumps(r["params"], sort_keys=True)))
+        if old:
+            ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+            flag = "  <-- slower" if ratio > 1.2 else ""
+            print(f"{r['name']:<32} {json.dumps(r['params']):<40} {old['p50_ms']:9.2f} -> {r['p50_ms']:9.2f} ms ({ratio:.2f}x){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-uri", help="use this MongoDB instead of mongomock")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="gallery sizes (employees)")
+    parser.add_argument("--photos", type=int, default=5, help="encodings per employee")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 40], help="faces per recognition / group size")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--enroll-employees", type=int, default=20)
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="simulated upload seconds")
+    parser.add_argument("--history-employees", type=int, default=200)
+    parser.add_argument("--history-days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="previous results JSON to compare with")
+    args = parser.parse_args()
+
+    harness.install(args.mongo_uri)
+    rng = np.random.default_rng(args.seed)
+    rec = Recorder()
+
+    bench_enrollment(rec, args, rng)
+    bench_recognition(rec, args, rng)
+    bench_attendance(rec, args, rng)
+    bench_viewer(rec, args, rng)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "backend": "mongod" if args.mongo_uri else "mongomock",
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "args": vars(args),
+        },
+        "results": rec.results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.out}")
+    if args.compare:
+        compare(rec.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Synthetic tenants for benchmarks: employees with random encodings and attendance history."""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.attendance import attendance_slot_id
+from utils.encoding_store import pack_encodings
+
+
+def employee_encodings(n_employees, photos, rng, spread=0.02):
+    """(n_employees x photos x 128) float32 encodings; photos of one employee lie close together."""
+    base = rng.normal(0, 0.1, (n_employees, 1, 128))
+    return (base + rng.normal(0, spread, (n_employees, photos, 128))).astype(np.float32)
+
+
+def synthetic_employees(organization, n_employees, photos, rng, packed=True):
+    """Employee documents as Save Images stores them (packed blobs, or legacy nested lists)."""
+    encodings = employee_encodings(n_employees, photos, rng)
+    docs = []
+    for i, encs in enumerate(encodings):
+        doc = {
+            "employee_id": f"E{i:06d}",
+            "employee_name": f"Employee {i}",
+            "organization": organization,
+            "uploaded_by": "bench",
+            "image_urls": [f"https://example.invalid/{organization}/{i}/{p}.jpg" for p in range(photos)],
+        }
+        if packed:
+            doc["face_encodings_blob"] = pack_encodings(encs)
+        else:
+            doc["face_encodings"] = encs.astype(np.float64).tolist()
+        docs.append(doc)
+    return docs, encodings
+
+
+def synthetic_attendance(organization, employees, days, start=datetime(2024, 1, 1), rng=None):
+    """One IN and one OUT per employee per working day, with jittered times."""
+    rng = rng or np.random.default_rng(0)
+    for day in range(days):
+        date = start + timedelta(days=day)
+        if date.weekday() >= 5:
+            continue
+        date_str = date.strftime("%Y-%m-%d")
+        for emp in employees:
+            for attendance_type, hour in (("IN", 9), ("OUT", 18)):
+                minute, second = rng.integers(0, 60, 2)
+                yield {
+                    "_id": attendance_slot_id(organization, emp["employee_id"], date_str, attendance_type),
+                    "employee_id": emp["employee_id"],
+                    "employee_name": emp["employee_name"],
+                    "organization": organization,
+                    "date": date_str,
+                    "time": f"{hour:02d}:{minute:02d}:{second:02d}",
+                    "type": attendance_type,
+                }
+
+
+def probe_encodings(encodings, n_faces, rng, noise=0.01):
+    """Encodings of n_faces known employees as a camera would see them again."""
+    picks = rng.choice(len(encodings), min(n_faces, len(encodings)), replace=False)
+    photo = rng.integers(0, encodings.shape[1], len(picks))
+    return encodings[picks, photo] + rng.normal(0, noise, (len(picks), 128)).astype(np.float32), picks
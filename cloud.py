@@ -1,66 +1,55 @@
-import cloudinary
-import cloudinary.uploader
-from dotenv import load_dotenv
-import os
 import uuid  # for unique image naming
+from concurrent.futures import ThreadPoolExecutor
+from resources import configure_cloudinary
+from utils.metrics import span
 
-# Load .env credentials
-load_dotenv()
-
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUD_NAME"),
-    api_key=os.getenv("CLOUD_API_KEY"),
-    api_secret=os.getenv("CLOUD_API_SECRET")
-)
-
-def upload_image_to_cloudinary(image_file, employee_name):
+def upload_image_to_cloudinary(image_file, employee_name, public_id=None):
     try:
-        # Use UUID to make filename unique
-        unique_id = str(uuid.uuid4())[:8]  # short unique suffix
-        public_id = f"{employee_name}_{unique_id}"
-
-        result = cloudinary.uploader.upload(
-            image_file,
-            folder="fra_employees",  # Optional folder in Cloudinary
-            public_id=public_id,
-            overwrite=False,  # Don't overwrite!
-            resource_type="image"
-        )
+        if public_id is None:
+            # Use UUID to make filename unique
+            unique_id = str(uuid.uuid4())[:8]  # short unique suffix
+            public_id = f"{employee_name}_{unique_id}"
+
+        # Configured on the first upload, not when the app starts
+        uploader = configure_cloudinary()
+        with span("cloud_upload"):
+            result = uploader.upload(
+                image_file,
+                folder="fra_employees",  # Optional folder in Cloudinary
+                public_id=public_id,
+                overwrite=False,  # Don't overwrite!
+                resource_type="image"
+            )
         return result.get("secure_url")
     except Exception as e:
         print(f"[Cloudinary Upload Error]: {e}")
         return None
 
-def upload_multiple_images_to_cloudinary(images_dict, employee_name):
+def upload_multiple_images_to_cloudinary(images_dict, employee_name, uploader=None, max_workers=5):
     """
-    Uploads multiple labeled face images for an employee.
+    Uploads multiple labeled face images for an employee concurrently.
     
     Parameters:
     - images_dict: dict like { "front": image_file, "left": image_file, ... }
     - employee_name: str
+    - uploader: callable(image_file, name) -> url or None, defaults to
+      upload_image_to_cloudinary (pass a fake one in tests)
+    - max_workers: number of uploads in flight at once
 
     Returns:
-    - List of Cloudinary URLs (in order of provided dict)
+    - List of Cloudinary URLs (in order of provided dict), None for failed uploads
     """
-    uploaded_urls = []
+    uploader = uploader or upload_image_to_cloudinary
+    if not images_dict:
+        return []
 
-    for label, image_file in images_dict.items():
+    def upload(label, image_file):
         try:
-            unique_id = str(uuid.uuid4())[:8]
-            public_id = f"{employee_name}_{label}_{unique_id}"
-            
-            result = cloudinary.uploader.upload(
-                image_file,
-                folder="fra_employees",
-                public_id=public_id,
-                overwrite=False,
-                resource_type="image"
-            )
-            uploaded_urls.append(result.get("secure_url"))
+            return uploader(image_file, f"{employee_name}_{label}")
         except Exception as e:
             print(f"[Upload Error for {label}]: {e}")
-            uploaded_urls.append(None)
-
-    return uploaded_urls
+            return None
 
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(images_dict))) as pool:
+        futures = [pool.submit(upload, label, image_file) for label, image_file in images_dict.items()]
+        return [future.result() for future in futures]
@@ -1,13 +1,187 @@
+import hashlib
+import json
 import os
-import pymongo
-from dotenv import load_dotenv
+import re
+import threading
+import time
+from collections import namedtuple
 
-load_dotenv()
+from pymongo.errors import ConnectionFailure
 
-client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-db = client[os.getenv("MONGO_DB")]
+from resources import get_mongo_client
 
-users_col = db["users"]
-employees_col = db["employees"]
-attendance_col = db["attendance"]
+# Collections split by organization. users stays shared: login looks a user
+# up before the organization is known
+TENANT_COLLECTIONS = ("employees", "attendance")
 
+# Where each organization's employees and attendance live. Unlisted
+# organizations use the shared collections; "*" applies to every unlisted one.
+#   {}                                   own collections in MONGO_DB ("tenant_<slug>.employees", ...)
+#   {"db": "fra_acme"}                   own database
+#   {"uri": "mongodb://...", "max_pool_size": 100}   another deployment, with its own pool
+#   "shared"                             the shared collections (exempts a tenant from "*")
+# e.g. MONGO_TENANTS={"acme": {"uri": "mongodb://acme-db:27017", "db": "fra_acme"}, "*": {}}
+MONGO_TENANTS = json.loads(os.getenv("MONGO_TENANTS", "{}"))
+
+# uri None = MONGO_URI; prefix is prepended to collection names
+Placement = namedtuple("Placement", ["uri", "database", "prefix", "max_pool_size"])
+
+# Indexes backing every query the app issues: (collection, keys, options)
+INDEXES = [
+    ("users", [("username", 1)], {"unique": True}),
+    ("employees", [("organization", 1), ("employee_id", 1)], {"unique": True}),
+    ("employees", [("organization", 1), ("_id", -1)], {}),
+    ("attendance", [("organization", 1), ("employee_id", 1), ("date", 1)], {}),
+    ("attendance", [("organization", 1), ("date", -1), ("time", -1)], {}),
+    ("attendance", [("organization", 1), ("employee_name", 1), ("date", -1), ("time", -1)], {}),
+]
+
+# Tenant placements whose indexes this process has ensured -> None, or
+# when to try again after a create_index failed
+_indexed = {}
+# One lock per placement: an unreachable deployment only holds up its own tenants
+_indexed_locks = {}
+_indexed_locks_lock = threading.Lock()
+INDEX_RETRY_SECONDS = 60
+
+_confirmed_unique = set()  # (collection name, keys) seen backed by a unique index
+
+
+def shared_placement():
+    return Placement(None, os.getenv("MONGO_DB"), "", None)
+
+
+def tenant_slug(organization):
+    """Collection-name-safe name of an organization; the hash keeps similar names apart."""
+    readable = re.sub(r"[^a-z0-9]+", "_", organization.lower()).strip("_")[:32]
+    return f"{readable}_{hashlib.sha1(organization.encode()).hexdigest()[:8]}"
+
+
+def tenant_placement(organization, tenants=None):
+    """Where an organization's collections live, according to MONGO_TENANTS."""
+    tenants = MONGO_TENANTS if tenants is None else tenants
+    config = tenants.get(organization, tenants.get("*", "shared"))
+    if config == "shared":
+        return shared_placement()
+
+    uri = config.get("uri")
+    if uri == os.getenv("MONGO_URI"):
+        uri = None  # so a placement naming the default deployment compares equal to it
+    database = config.get("db")
+    prefix = "" if database else f"tenant_{tenant_slug(organization)}."
+    return Placement(uri, database or os.getenv("MONGO_DB"), prefix, config.get("max_pool_size"))
+
+
+def get_database(placement=None):
+    placement = placement or shared_placement()
+    return get_mongo_client(placement.uri, placement.max_pool_size)[placement.database]
+
+
+def users_collection():
+    return get_database()["users"]
+
+
+def tenant_collection(organization, name):
+    """The collection holding an organization's `name` documents ("employees" or "attendance").
+
+    Documents keep their organization field wherever they live, so every
+    query still filters on it. A tenant's indexes are created the first
+    time this process touches its collections.
+    """
+    placement = tenant_placement(organization)
+    if placement != shared_placement():
+        _ensure_tenant_indexes(placement)
+    return get_database(placement)[placement.prefix + name]
+
+
+def _create_indexes(database, prefix="", names=None):
+    """Creates each index on its own, so one failure doesn't skip the rest. Returns the failures."""
+    failures = []
+    unreachable = None
+    for name, keys, options in INDEXES:
+        if names is not None and name not in names:
+            continue
+        try:
+            if unreachable:
+                raise unreachable  # no use waiting for server selection again
+            database[prefix + name].create_index(keys, **options)
+        except Exception as e:
+            if isinstance(e, ConnectionFailure):
+                unreachable = e
+            failures.append((prefix + name, keys, e))
+            print(f"[Index Error] {database.name}.{prefix}{name} {keys}{' (unique)' if options.get('unique') else ''}: {e}")
+    return failures
+
+
+def _indexes_current(placement):
+    state = _indexed.get(placement, 0)
+    return state is None or state > time.monotonic()
+
+
+def _ensure_tenant_indexes(placement):
+    if _indexes_current(placement):
+        return
+    with _indexed_locks_lock:
+        lock = _indexed_locks.setdefault(placement, threading.Lock())
+    with lock:
+        if _indexes_current(placement):
+            return
+        failures = _create_indexes(get_database(placement), placement.prefix, TENANT_COLLECTIONS)
+        _indexed[placement] = time.monotonic() + INDEX_RETRY_SECONDS if failures else None
+
+
+def all_collections(name):
+    """Every collection holding `name` documents: the shared one and each tenant's."""
+    placements = {shared_placement()}
+    placements.update(tenant_placement(org) for org in MONGO_TENANTS)
+
+    seen = set()
+    for placement in placements:
+        if (placement.uri, placement.database) in seen:
+            continue
+        seen.add((placement.uri, placement.database))
+
+        database = get_database(placement)
+        for collection in sorted(database.list_collection_names()):
+            if collection == name or (collection.startswith("tenant_") and collection.endswith(f".{name}")):
+                yield database[collection]
+
+
+def ensure_indexes():
+    """Creates missing indexes on the shared collections and every explicitly listed tenant.
+
+    Safe to run on every startup (create_index is idempotent). Tenants
+    that only match "*" get theirs on first use. Every index is attempted
+    even if some fail; returns the failures of the shared collections as
+    (collection, keys, error).
+    """
+    failures = _create_indexes(get_database())
+
+    for organization in MONGO_TENANTS:
+        placement = tenant_placement(organization)
+        if organization != "*" and placement != shared_placement():
+            _ensure_tenant_indexes(placement)
+    return failures
+
+
+def has_unique_index(collection, keys):
+    """True once `collection` is confirmed to have a unique index on exactly `keys`.
+
+    Code relying on DuplicateKeyError must check this first: the index may
+    not exist (Mongo was down at startup, or duplicates already stored
+    prevented building it). A confirmation is remembered for the process.
+    """
+    token = (collection.full_name, tuple(keys))
+    if token in _confirmed_unique:
+        return True
+    for info in collection.index_information().values():
+        if info.get("unique") and [tuple(k) for k in info["key"]] == [tuple(k) for k in keys]:
+            _confirmed_unique.add(token)
+            return True
+    return False
+
+
+if __name__ == "__main__":
+    if ensure_indexes():
+        raise SystemExit("Some indexes could not be created, see above.")
+    print("Indexes are up to date.")
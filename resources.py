@@ -0,0 +1,109 @@
+"""Process-wide clients and models, created on first use.
+
+Streamlit re-executes app.py on every interaction, but modules are
+imported once per server process, so everything here is built at most
+once and shared by every session. Nothing is created at import time:
+the login page doesn't pay for Cloudinary or dlib's face models.
+"""
+import os
+import threading
+
+import pymongo
+from dotenv import load_dotenv
+
+# The one place .env is read; import this module before reading settings
+load_dotenv()
+
+# Connection pool and timeouts of the shared MongoClient
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))  # server selection and connect
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+_lock = threading.Lock()
+_mongo_clients = {}  # (uri, max pool size) -> MongoClient
+_cloudinary_configured = False
+
+_shared = {}  # name -> object built by shared()
+_shared_lock = threading.RLock()  # reentrant: a factory may use other shared objects
+
+
+def get_mongo_client(uri=None, max_pool_size=None):
+    """The MongoClient of this process for a deployment (MONGO_URI by default).
+
+    pymongo clients are thread-safe and pool connections, so tenants on
+    the same deployment share one client; a tenant with its own
+    max_pool_size gets a separate pool.
+    """
+    uri = uri or os.getenv("MONGO_URI")
+    max_pool_size = max_pool_size or MONGO_MAX_POOL_SIZE
+    with _lock:
+        client = _mongo_clients.get((uri, max_pool_size))
+        if client is None:
+            client = _mongo_clients[(uri, max_pool_size)] = pymongo.MongoClient(
+                uri,
+                maxPoolSize=max_pool_size,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+                serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                appname="fra",
+            )
+        return client
+
+
+def shared(name, factory):
+    """This process's `name` object (a pool, queue or store), built by factory() on first use."""
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+def replace_shared(name, broken, factory):
+    """Rebuilds `name` with factory() if it is still `broken`. Returns the current object.
+
+    Threads that hit the same broken object replace it only once.
+    """
+    with _shared_lock:
+        if _shared.get(name) is broken:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+def configure_cloudinary():
+    """Imports and configures the Cloudinary SDK once; returns its uploader module."""
+    global _cloudinary_configured
+    import cloudinary
+    import cloudinary.uploader
+
+    with _lock:
+        if not _cloudinary_configured:
+            cloudinary.config(
+                cloud_name=os.getenv("CLOUD_NAME"),
+                api_key=os.getenv("CLOUD_API_KEY"),
+                api_secret=os.getenv("CLOUD_API_SECRET"),
+            )
+            _cloudinary_configured = True
+    return cloudinary.uploader
+
+
+def face_models():
+    """The face_recognition module; the first call loads dlib's models (a second or two)."""
+    import face_recognition
+
+    return face_recognition
+
+
+def warm_up(models=False):
+    """Opens the Mongo connection pool ahead of the first request.
+
+    With models=True also loads the face models (only worth it in
+    processes that detect or encode faces themselves). Cloudinary is left
+    to the first upload: importing its SDK alone takes ~0.1s of GIL time.
+    """
+    get_mongo_client().admin.command("ping")
+    if models:
+        face_models()
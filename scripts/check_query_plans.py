@@ -0,0 +1,93 @@
+"""Fails if any query the app issues is planned as a collection scan.
+
+Runs explain() for every query shape below against the configured MongoDB
+(MONGO_URI / MONGO_DB), after making sure the indexes from db.INDEXES exist.
+Needs a real mongod; exits with status 1 when a winning plan contains a
+COLLSCAN stage. Run from the repo root:
+
+    python -m scripts.check_query_plans
+"""
+import sys
+
+from db import ensure_indexes, get_database
+
+ORG = "plan-check-org"
+
+# (description, explain command) for each query the app issues
+QUERIES = [
+    ("login: users by username",
+     {"find": "users", "filter": {"username": "someone"}, "limit": 1}),
+    ("admin: employee id exists",
+     {"find": "employees", "filter": {"employee_id": "E1", "organization": ORG}, "limit": 1}),
+    ("recognition: gallery load",
+     {"find": "employees", "filter": {"organization": ORG}}),
+    ("recognition: gallery version (newest)",
+     {"find": "employees", "filter": {"organization": ORG}, "sort": {"_id": -1}, "limit": 1}),
+    ("recognition: gallery version (count)",
+     {"aggregate": "employees", "pipeline": [{"$match": {"organization": ORG}}, {"$group": {"_id": 1, "n": {"$sum": 1}}}], "cursor": {}}),
+    ("attendance: today's logs per employee",
+     {"aggregate": "attendance", "pipeline": [
+         {"$match": {"organization": ORG, "employee_id": {"$in": ["E1", "E2"]}, "date": {"$in": ["2024-01-01"]}}},
+         {"$group": {"_id": {"employee_id": "$employee_id", "date": "$date"}, "count": {"$sum": 1}}},
+     ], "cursor": {}}),
+    ("viewer: employee names",
+     {"distinct": "attendance", "key": "employee_name", "query": {"organization": ORG}}),
+    ("viewer: logs page",
+     {"find": "attendance", "filter": {"organization": ORG}, "sort": {"date": -1, "time": -1}, "skip": 50, "limit": 50}),
+    ("viewer: logs page by employee",
+     {"find": "attendance", "filter": {"organization": ORG, "employee_name": "Someone"}, "sort": {"date": -1, "time": -1}, "limit": 50}),
+    ("viewer: logs page by date",
+     {"find": "attendance", "filter": {"organization": ORG, "date": "2024-01-01"}, "sort": {"date": -1, "time": -1}, "limit": 50}),
+    ("export: date range",
+     {"find": "attendance", "filter": {"organization": ORG, "date": {"$gte": "2024-01-01", "$lte": "2024-01-31"}}, "sort": {"date": 1, "time": 1}}),
+    ("viewer: daily summary",
+     {"aggregate": "attendance", "pipeline": [
+         {"$match": {"organization": ORG, "date": "2024-01-01"}},
+         {"$group": {"_id": {"employee_id": "$employee_id", "date": "$date"}, "n": {"$sum": 1}}},
+     ], "cursor": {}}),
+]
+
+
+def plan_stages(plan):
+    """Yields every stage name in an explain plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def winning_plan(explain):
+    # find() puts the planner output at the top level, aggregate() inside its first stage
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"]["winningPlan"]
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]["queryPlanner"]["winningPlan"]
+    return explain
+
+
+def main():
+    ensure_indexes()
+    db = get_database()  # tenant collections get the same indexes (db.INDEXES)
+    failures = []
+
+    for description, command in QUERIES:
+        explain = db.command("explain", command, verbosity="queryPlanner")
+        stages = set(plan_stages(winning_plan(explain)))
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{status:>8}  {description}  {sorted(stages)}")
+        if status != "ok":
+            failures.append(description)
+
+    if failures:
+        print(f"\n{len(failures)} query(s) fall back to a collection scan.")
+        sys.exit(1)
+    print("\nAll queries use an index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Shrink every employee's face encodings to a bounded set of templates.
+
+Each employee with more than --max-templates encodings (or without a
+stored centroid yet) has its encodings clustered: near-duplicates merge,
+then the closest groups, until at most --max-templates representative
+encodings are left. These are stored as face_encodings_blob, next to
+face_centroid_blob (the mean of every encoding the employee had; an
+existing one is kept, since the encodings of an employee consolidated
+before are already reduced), and legacy encoding fields are removed. Persisted face indexes of the
+organizations touched are deleted so they rebuild; running servers pick
+the change up within the gallery cache TTL. Run from the repo root:
+
+    python -m scripts.consolidate_templates --dry-run
+    python -m scripts.consolidate_templates --max-templates 5
+"""
+import argparse
+import os
+
+from pymongo import UpdateOne
+
+from db import all_collections
+from utils.encoding_store import pack_encodings
+from utils.face_utils import GALLERY_PROJECTION, index_path
+from utils.gallery import employee_rows
+from utils.templates import MAX_TEMPLATES, MERGE_RADIUS, consolidate
+
+LEGACY_FIELDS = ("face_encodings", "face_encoding")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-templates", type=int, default=MAX_TEMPLATES)
+    parser.add_argument("--merge-radius", type=float, default=MERGE_RADIUS, help="distance under which encodings are near-duplicates")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only report how the galleries would shrink")
+    args = parser.parse_args()
+
+    employees = changed = rows_before = rows_after = 0
+    organizations = set()
+
+    for employees_col in all_collections("employees"):
+        ops = []
+        for doc in employees_col.find({}, {**GALLERY_PROJECTION, "_id": 1, "organization": 1}):
+            rows = employee_rows(doc)
+            employees += 1
+            rows_before += len(rows)
+            has_legacy = any(field in doc for field in LEGACY_FIELDS)
+            if not len(rows) or (len(rows) <= args.max_templates and "face_centroid_blob" in doc and not has_legacy):
+                rows_after += len(rows)
+                continue
+
+            templates, centroid = consolidate(rows, args.max_templates, args.merge_radius)
+            rows_after += len(templates)
+            changed += 1
+            organizations.add(doc["organization"])
+
+            update = {"$set": {"face_encodings_blob": pack_encodings(templates)}}
+            if doc.get("face_centroid_blob") is None:
+                update["$set"]["face_centroid_blob"] = pack_encodings(centroid)
+            if has_legacy:
+                update["$unset"] = {field: "" for field in LEGACY_FIELDS}
+            ops.append(UpdateOne({"_id": doc["_id"]}, update))
+
+            if len(ops) >= args.batch_size:
+                if not args.dry_run:
+                    employees_col.bulk_write(ops, ordered=False)
+                ops = []
+
+        if ops and not args.dry_run:
+            employees_col.bulk_write(ops, ordered=False)
+
+    if not args.dry_run:
+        for org in organizations:
+            if os.path.exists(index_path(org)):
+                os.remove(index_path(org))
+
+    print(f"{'Would consolidate' if args.dry_run else 'Consolidated'} {changed} of {employees} employee(s) "
+          f"in {len(organizations)} organization(s)")
+    if rows_before:
+        print(f"Gallery rows: {rows_before} -> {rows_after} ({rows_after / rows_before:.0%} of before)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Export an organization's attendance to CSV or Parquet.
+
+Streams from MongoDB in batches, so memory use does not grow with the
+date range. Run from the repo root:
+
+    python -m scripts.export_attendance --org acme --from 2024-05-01 --to 2024-05-31 -o may.parquet
+"""
+import argparse
+import sys
+import time
+
+from utils.export import BATCH_SIZE, EXPORT_FORMATS, export_attendance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--org", required=True, help="organization name")
+    parser.add_argument("--employee", help="only this employee name")
+    parser.add_argument("--from", dest="start_date", help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_date", help="last date, YYYY-MM-DD")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="defaults to the output file extension, else csv")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout (csv only)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    if fmt == "parquet" and args.output == "-":
+        parser.error("Parquet output needs a file name")
+
+    start = time.perf_counter()
+    if args.output == "-":
+        rows = export_attendance(sys.stdout.buffer, fmt, args.org, args.employee, args.start_date, args.end_date, args.batch_size)
+    else:
+        with open(args.output, "wb") as out:
+            rows = export_attendance(out, fmt, args.org, args.employee, args.start_date, args.end_date, args.batch_size)
+
+    print(f"Exported {rows} rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Import attendance offline from a folder or zip of timestamped images.
+
+For sites that lost connectivity: replays a shift of camera stills
+through the recognition workers, using each image's own time (EXIF,
+file name or file time) for IN/OUT. Progress is checkpointed, so
+re-running the same command after an interruption resumes it. Run from
+the repo root:
+
+    python -m scripts.import_attendance --org acme shift-2024-05-13.zip
+"""
+import argparse
+from datetime import timedelta
+
+from utils.batch_import import Checkpoint, import_attendance
+from utils.recognition_worker import RecognitionPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="folder or .zip of images")
+    parser.add_argument("--org", required=True, help="organization name")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <source>.checkpoint.json)")
+    parser.add_argument("--workers", type=int, default=None, help="recognition processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="images per bulk write")
+    parser.add_argument("--cooldown", type=float, default=300, help="seconds within which stills of one person count once")
+    parser.add_argument("--tolerance", type=float, default=0.4)
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.source.rstrip('/')}.checkpoint.json")
+    pool = RecognitionPool(workers=args.workers, max_pending=64, timeout=300)
+    try:
+        totals = import_attendance(
+            args.source,
+            args.org,
+            pool,
+            checkpoint=checkpoint,
+            chunk_size=args.chunk_size,
+            tolerance=args.tolerance,
+            cooldown=timedelta(seconds=args.cooldown),
+        )
+    finally:
+        pool.shutdown()
+
+    print(f"Done: {totals['images']} images, {totals['marked']} entries marked, {totals['skipped']} skipped")
+
+
+if __name__ == "__main__":
+    main()
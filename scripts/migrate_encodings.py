@@ -0,0 +1,94 @@
+"""Move employee encodings from nested float lists to packed binary blobs.
+
+Every employee document (shared or in a tenant's own collections) still
+holding `face_encodings` (list of 128 doubles per photo) and/or the
+legacy single `face_encoding` gets one `face_encodings_blob` with all of
+them (plus those of a blob it already has), and the old fields are removed.
+Reports the BSON size of the migrated documents and the time to load
+and parse galleries before and after. Run from the repo root:
+
+    python -m scripts.migrate_encodings --dry-run
+    python -m scripts.migrate_encodings --dtype float16
+"""
+import argparse
+import time
+
+import bson
+from pymongo import UpdateOne
+
+from db import all_collections
+from utils.encoding_store import pack_encodings
+from utils.face_utils import GALLERY_PROJECTION
+from utils.gallery import FaceGallery, employee_rows
+
+LEGACY_FIELDS = ("face_encodings", "face_encoding")
+
+
+def load_all_galleries():
+    """Loads and parses the gallery of every organization. Returns (seconds, encodings)."""
+    start = time.perf_counter()
+    total = 0
+    for employees_col in all_collections("employees"):
+        for org in employees_col.distinct("organization"):
+            total += len(FaceGallery.from_employees(employees_col.find({"organization": org}, GALLERY_PROJECTION)))
+    return time.perf_counter() - start, total
+
+
+def migrated_document(doc, dtype):
+    # Every encoding the gallery would load, blob included, goes into the new blob
+    encodings = employee_rows(doc)
+
+    new_doc = {k: v for k, v in doc.items() if k not in LEGACY_FIELDS}
+    if len(encodings):
+        new_doc["face_encodings_blob"] = pack_encodings(encodings, dtype)
+    return new_doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="only report the size change")
+    args = parser.parse_args()
+
+    before_s, before_n = load_all_galleries()
+
+    query = {"$or": [{field: {"$exists": True}} for field in LEGACY_FIELDS]}
+    docs = bytes_before = bytes_after = 0
+    ops = []
+
+    for employees_col in all_collections("employees"):
+        for doc in employees_col.find(query):
+            new_doc = migrated_document(doc, args.dtype)
+            bytes_before += len(bson.encode(doc))
+            bytes_after += len(bson.encode(new_doc))
+            docs += 1
+
+            update = {"$unset": {field: "" for field in LEGACY_FIELDS}}
+            if "face_encodings_blob" in new_doc:
+                update["$set"] = {"face_encodings_blob": new_doc["face_encodings_blob"]}
+            ops.append(UpdateOne({"_id": doc["_id"]}, update))
+
+            if len(ops) >= args.batch_size:
+                if not args.dry_run:
+                    employees_col.bulk_write(ops, ordered=False)
+                ops = []
+
+        if ops and not args.dry_run:
+            employees_col.bulk_write(ops, ordered=False)
+        ops = []
+
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {docs} employee document(s) to {args.dtype} blobs")
+    if docs:
+        print(f"BSON size: {bytes_before / 1024:.1f} KiB -> {bytes_after / 1024:.1f} KiB "
+              f"({bytes_after / bytes_before:.0%} of before)")
+    print(f"Gallery load ({before_n} encodings): {before_s * 1000:.0f} ms before", end="")
+    if args.dry_run:
+        print()
+    else:
+        after_s, _ = load_all_galleries()
+        print(f", {after_s * 1000:.0f} ms after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Move organizations out of the shared collections into their own.
+
+Set MONGO_TENANTS to the new layout first (see db.py). For every
+organization in the shared employees and attendance collections that
+MONGO_TENANTS places elsewhere, the documents are copied to the tenant's
+collections with their _id, so re-running skips what is already there.
+Indexes are created on the target. With --delete-source, shared copies
+are removed once they are confirmed present in the target.
+
+Stop the app during the move, or run again after restarting it with the
+new MONGO_TENANTS to pick up entries written in between. Run from the
+repo root:
+
+    python -m scripts.split_tenants --dry-run
+    python -m scripts.split_tenants --org acme --delete-source
+"""
+import argparse
+import time
+
+from pymongo.errors import BulkWriteError
+
+from db import TENANT_COLLECTIONS, get_database, shared_placement, tenant_collection, tenant_placement
+from utils.attendance import DUPLICATE_KEY
+
+
+def copy_documents(source, target, organization, batch_size):
+    """Copies an organization's documents. Returns (copied, already present)."""
+    copied = present = 0
+    batch = []
+
+    def flush():
+        nonlocal copied, present
+        try:
+            target.insert_many(batch, ordered=False)
+            copied += len(batch)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err["code"] != DUPLICATE_KEY for err in errors):
+                raise
+            present += len(errors)
+            copied += len(batch) - len(errors)
+
+    for doc in source.find({"organization": organization}, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return copied, present
+
+
+def delete_copied(source, target, organization, batch_size):
+    """Deletes the organization's shared documents that exist in the target. Returns how many."""
+    deleted = 0
+    ids = [doc["_id"] for doc in source.find({"organization": organization}, {"_id": 1})]
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        confirmed = [doc["_id"] for doc in target.find({"_id": {"$in": chunk}}, {"_id": 1})]
+        if confirmed:
+            deleted += source.delete_many({"_id": {"$in": confirmed}}).deleted_count
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--org", action="append", help="only these organizations (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--delete-source", action="store_true", help="remove moved documents from the shared collections")
+    parser.add_argument("--dry-run", action="store_true", help="only show where each organization would go")
+    args = parser.parse_args()
+
+    shared = shared_placement()
+    shared_db = get_database(shared)
+    organizations = set()
+    for name in TENANT_COLLECTIONS:
+        organizations.update(shared_db[name].distinct("organization"))
+    if args.org:
+        organizations &= set(args.org)
+
+    moved = [org for org in sorted(organizations) if tenant_placement(org) != shared]
+    if not moved:
+        print("No organization in the shared collections is placed elsewhere by MONGO_TENANTS.")
+        return
+
+    for org in moved:
+        placement = tenant_placement(org)
+        where = f"{placement.uri or 'MONGO_URI'} / {placement.database} / {placement.prefix}*"
+        if args.dry_run:
+            counts = ", ".join(f"{shared_db[name].count_documents({'organization': org})} {name}" for name in TENANT_COLLECTIONS)
+            print(f"{org}: {counts} -> {where}")
+            continue
+
+        for name in TENANT_COLLECTIONS:
+            source = shared_db[name]
+            target = tenant_collection(org, name)  # also creates the tenant's indexes
+            start = time.perf_counter()
+            copied, present = copy_documents(source, target, org, args.batch_size)
+
+            expected = source.count_documents({"organization": org})
+            found = target.count_documents({"organization": org})
+            line = f"{org} {name}: {copied} copied, {present} already there ({time.perf_counter() - start:.1f}s)"
+            if found < expected:
+                print(f"{line}; target has {found} of {expected}, keeping the shared copies")
+                continue
+
+            if args.delete_source:
+                line += f", {delete_copied(source, target, org, args.batch_size)} removed from shared"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""Tests run against mongomock: benchmarks.harness points db at it before anything imports db."""
+import pytest
+
+from benchmarks import harness
+
+harness.install()
+
+import db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_mongo():
+    """Every test starts from empty databases."""
+    client = db.get_mongo_client()
+    for name in client.list_database_names():
+        client.drop_database(name)
+    db._indexed.clear()
+    db._confirmed_unique.clear()
+    yield
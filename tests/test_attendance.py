@@ -0,0 +1,84 @@
+"""record_attendance_events against a mongomock attendance collection."""
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import utils.attendance as attendance
+from db import tenant_collection
+from utils.attendance import TIMEZONE, record_attendance_events
+
+ALICE = {"employee_id": "E1", "employee_name": "Alice"}
+BOB = {"employee_id": "E2", "employee_name": "Bob"}
+
+
+def at(hour, minute=0, second=0):
+    return TIMEZONE.localize(datetime(2030, 1, 1, hour, minute, second))
+
+
+def stored(organization="acme"):
+    rows = tenant_collection(organization, "attendance").find({"organization": organization})
+    return sorted((row["employee_id"], row["type"], row["time"]) for row in rows)
+
+
+def test_in_then_out_then_nothing():
+    assert record_attendance_events([(ALICE, at(17)), (ALICE, at(8))], "acme") == (["Alice", "Alice"], [])
+    assert record_attendance_events([(ALICE, at(18))], "acme") == ([], ["Alice"])
+    assert stored() == [("E1", "IN", "08:00:00"), ("E1", "OUT", "17:00:00")]
+
+
+def test_double_submit_is_one_check_in():
+    assert record_attendance_events([(ALICE, at(8))], "acme") == (["Alice"], [])
+    assert record_attendance_events([(ALICE, at(8))], "acme") == ([], [])
+    assert stored() == [("E1", "IN", "08:00:00")]
+
+
+def test_concurrent_double_submit_loses_on_the_slot(monkeypatch):
+    record_attendance_events([(ALICE, at(8))], "acme")
+    # The second request read the state before the first one wrote
+    monkeypatch.setattr(attendance, "_logged_state", lambda *args: {})
+
+    assert record_attendance_events([(ALICE, at(8)), (BOB, at(8))], "acme") == (["Bob"], ["Alice"])
+    assert stored() == [("E1", "IN", "08:00:00"), ("E2", "IN", "08:00:00")]
+
+
+class WritesFirstOnly:
+    """An attendance collection whose insert_many fails after the first document."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def insert_many(self, docs, ordered=True):
+        self._collection.insert_one(docs[0])
+        raise BulkWriteError({"writeErrors": [{"index": i, "code": 91, "errmsg": "shutdown"} for i in range(1, len(docs))]})
+
+
+def test_replay_after_a_partial_bulk_write(monkeypatch):
+    events = [(ALICE, at(8)), (BOB, at(8, 1))]
+    monkeypatch.setattr(attendance, "tenant_collection", lambda org, name: WritesFirstOnly(tenant_collection(org, name)))
+    with pytest.raises(BulkWriteError):
+        record_attendance_events(events, "acme")
+    monkeypatch.undo()
+
+    assert record_attendance_events(events, "acme") == (["Bob"], [])
+    assert stored() == [("E1", "IN", "08:00:00"), ("E2", "IN", "08:01:00")]
+
+
+def test_coalesce_window():
+    window = timedelta(seconds=60)
+    record_attendance_events([(ALICE, at(8)), (ALICE, at(8, 0, 45))], "acme", coalesce=window)
+    assert stored() == [("E1", "IN", "08:00:00")]
+
+    # Measured from the latest entry, stored or not
+    record_attendance_events([(ALICE, at(8, 1))], "acme", coalesce=window)
+    record_attendance_events([(ALICE, at(8, 2))], "acme", coalesce=window)
+    assert stored() == [("E1", "IN", "08:00:00"), ("E1", "OUT", "08:02:00")]
+
+
+def test_event_earlier_than_stored_entries_is_skipped():
+    record_attendance_events([(ALICE, at(9))], "acme")
+    assert record_attendance_events([(ALICE, at(8))], "acme") == ([], ["Alice"])
+    assert stored() == [("E1", "IN", "09:00:00")]
@@ -0,0 +1,136 @@
+"""AttendanceQueue flushing into a mongomock attendance collection."""
+from datetime import datetime
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+import utils.attendance_queue as attendance_queue
+from db import tenant_collection
+from utils.attendance import TIMEZONE
+from utils.metrics import registry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    # Not started: the tests flush by hand
+    return attendance_queue.AttendanceQueue(str(tmp_path / "queue.sqlite3"), clock=clock, max_attempts=3)
+
+
+def employee(i):
+    return {"employee_id": f"E{i}", "employee_name": f"Employee {i}"}
+
+
+def at(hour, minute=0):
+    return TIMEZONE.localize(datetime(2030, 1, 1, hour, minute))
+
+
+def stored(organization):
+    rows = tenant_collection(organization, "attendance").find({"organization": organization})
+    return sorted((row["employee_id"], row["type"], row.get("time")) for row in rows)
+
+
+def failing_for(employee_ids, error):
+    """record_attendance_events that raises whenever one of employee_ids is in the batch."""
+    record = attendance_queue.record_attendance_events
+
+    def record_or_fail(events, organization, coalesce):
+        if any(emp["employee_id"] in employee_ids for emp, _ in events):
+            raise error
+        return record(events, organization, coalesce=coalesce)
+    return record_or_fail
+
+
+def test_permanent_error_dead_letters_only_the_bad_event(queue, clock, monkeypatch):
+    monkeypatch.setattr(attendance_queue, "record_attendance_events", failing_for({"E2"}, ValueError("bad document")))
+    queue.enqueue([(employee(1), at(8)), (employee(2), at(8)), (employee(3), at(8))], "acme")
+
+    for _ in range(3):
+        queue.flush_once()
+        clock.now += 3600
+
+    assert stored("acme") == [("E1", "IN", "08:00:00"), ("E3", "IN", "08:00:00")]
+    assert queue.pending() == 0 and queue.dead_letters("acme") == 1
+    assert queue.stats["failed_attempts"] == 2 and queue.stats["dead_lettered"] == 1
+
+    monkeypatch.undo()
+    assert queue.requeue_dead_letters() == 1
+    queue.flush_once()
+    assert ("E2", "IN", "08:00:00") in stored("acme")
+    assert queue.dead_letters() == 0
+
+
+def test_unreachable_mongo_is_retried_past_max_attempts(queue, clock, monkeypatch):
+    monkeypatch.setattr(attendance_queue, "record_attendance_events", failing_for({"E1"}, AutoReconnect("down")))
+    queue.enqueue([(employee(1), at(8))], "acme")
+
+    for _ in range(5):
+        queue.flush_once()
+        clock.now += 3600
+
+    assert queue.pending() == 1 and queue.dead_letters() == 0
+
+
+def test_backlog_and_failures_reach_metrics(queue, clock, monkeypatch):
+    monkeypatch.setattr(attendance_queue, "record_attendance_events", failing_for({"E1"}, AutoReconnect("down")))
+    before = registry.snapshot()["counters"].get("attendance_queue_failed_attempts", 0)
+    queue.enqueue([(employee(1), at(8)), (employee(1), at(17))], "acme")
+    queue.flush_once()
+
+    snapshot = registry.snapshot()
+    assert snapshot["gauges"]["attendance_queue_pending"] == 2
+    assert snapshot["gauges"]["attendance_queue_dead_letters"] == 0
+    assert snapshot["counters"]["attendance_queue_failed_attempts"] == before + 1
+
+
+def test_legacy_entry_without_time_does_not_fail_the_flush(queue):
+    tenant_collection("acme", "attendance").insert_one(
+        {"organization": "acme", "employee_id": "E1", "employee_name": "Employee 1", "date": "2030-01-01", "type": "IN"}
+    )
+    queue.enqueue([(employee(1), at(17))], "acme")
+    queue.flush_once()
+
+    assert queue.pending() == 0
+    assert ("E1", "OUT", "17:00:00") in stored("acme")
+
+
+def test_retry_keeps_order_and_holds_back_only_that_organization(queue, clock, monkeypatch):
+    monkeypatch.setattr(attendance_queue, "record_attendance_events", failing_for({"E1"}, AutoReconnect("down")))
+    queue.enqueue([(employee(1), at(8))], "acme")
+    queue.flush_once()
+    monkeypatch.undo()
+
+    # The exit arrives while the arrival waits for its retry
+    queue.enqueue([(employee(1), at(17))], "acme")
+    queue.enqueue([(employee(2), at(8))], "other")
+    queue.flush_once()
+    assert stored("acme") == [] and stored("other") == [("E2", "IN", "08:00:00")]
+
+    clock.now += queue.base_delay
+    queue.flush_once()
+    assert stored("acme") == [("E1", "IN", "08:00:00"), ("E1", "OUT", "17:00:00")]
+    assert queue.pending() == 0
+
+
+def test_only_the_lease_holder_flushes(queue, tmp_path, clock):
+    other = attendance_queue.AttendanceQueue(queue.path, clock=clock)
+    queue.enqueue([(employee(1), at(8))], "acme")
+    assert queue.flush_once() == 1
+
+    queue.enqueue([(employee(2), at(8))], "acme")
+    assert other.flush_once() == 0
+    clock.now += attendance_queue.WRITER_LEASE + 1  # the holder went away
+    assert other.flush_once() == 1
+    assert queue.flush_once() == 0 and queue.pending() == 0
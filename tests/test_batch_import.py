@@ -0,0 +1,45 @@
+"""import_attendance replaying stills over attendance that is already stored."""
+import io
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from db import tenant_collection
+from utils.attendance import TIMEZONE, record_attendance_events
+from utils.batch_import import import_attendance
+
+EMPLOYEE = {"employee_id": "E1", "employee_name": "Employee 1"}
+
+
+class SeesEveryone:
+    """Recognition pool stand-in: every still shows the same employee."""
+
+    def submit(self, data, organization, tolerance):
+        return data
+
+    def wait(self, future):
+        return [EMPLOYEE]
+
+
+def save_still(folder, when):
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buf, format="PNG")
+    (folder / f"gate-{when:%Y-%m-%d %H.%M.%S}.png").write_bytes(buf.getvalue())
+
+
+def stored(organization):
+    rows = tenant_collection(organization, "attendance").find({"organization": organization}, {"_id": 0, "time": 1, "type": 1})
+    return sorted((row["type"], row["time"]) for row in rows)
+
+
+def test_replay_over_a_day_that_already_has_an_in(tmp_path):
+    day = datetime(2030, 1, 1)
+    record_attendance_events([(EMPLOYEE, TIMEZONE.localize(day.replace(hour=8)))], "acme")
+
+    # The same arrival, caught by the gate camera, then the real exit
+    save_still(tmp_path, day.replace(hour=8, second=30))
+    save_still(tmp_path, day.replace(hour=17))
+    totals = import_attendance(str(tmp_path), "acme", SeesEveryone(), cooldown=timedelta(minutes=5), log=lambda *_: None)
+
+    assert stored("acme") == [("IN", "08:00:00"), ("OUT", "17:00:00")]
+    assert totals["marked"] == 1
@@ -0,0 +1,34 @@
+"""upload_multiple_images_to_cloudinary with a fake uploader in place of Cloudinary."""
+import threading
+
+from cloud import upload_multiple_images_to_cloudinary
+
+
+def test_urls_in_input_order_with_none_for_failures():
+    def uploader(image_file, name):
+        if image_file == b"broken":
+            raise IOError("connection reset")
+        return None if image_file == b"rejected" else f"https://cdn.example/{name}"
+
+    images = {"front": b"front", "left": b"broken", "right": b"rejected", "up": b"up"}
+    assert upload_multiple_images_to_cloudinary(images, "alice", uploader=uploader) == [
+        "https://cdn.example/alice_front", None, None, "https://cdn.example/alice_up",
+    ]
+
+
+def test_uploads_run_concurrently():
+    # Every upload waits for the others: this only finishes if all are in flight at once
+    barrier = threading.Barrier(3, timeout=5)
+
+    def uploader(image_file, name):
+        barrier.wait()
+        return name
+
+    images = {"front": b"1", "left": b"2", "right": b"3"}
+    assert upload_multiple_images_to_cloudinary(images, "bob", uploader=uploader, max_workers=3) == [
+        "bob_front", "bob_left", "bob_right",
+    ]
+
+
+def test_no_images():
+    assert upload_multiple_images_to_cloudinary({}, "carol", uploader=lambda *args: "unused") == []
@@ -0,0 +1,44 @@
+"""scripts.consolidate_templates against mongomock."""
+import sys
+
+import numpy as np
+
+from db import tenant_collection
+from scripts import consolidate_templates
+from utils.encoding_store import pack_encodings, unpack_encodings
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["consolidate_templates", *args])
+    consolidate_templates.main()
+
+
+def test_existing_centroid_is_kept(monkeypatch):
+    rng = np.random.default_rng(0)
+    enrolled = rng.normal(0, 0.1, (12, 128)).astype(np.float32)
+    centroid = enrolled.mean(axis=0)
+    employees = tenant_collection("acme", "employees")
+    employees.insert_one({
+        "organization": "acme", "employee_id": "E1", "employee_name": "Alice",
+        "face_encodings_blob": pack_encodings(enrolled[:6]),  # consolidated before, from all 12
+        "face_centroid_blob": pack_encodings(centroid),
+    })
+
+    run(monkeypatch, "--max-templates", "2")
+
+    doc = employees.find_one({"employee_id": "E1"})
+    assert len(unpack_encodings(doc["face_encodings_blob"])) == 2
+    np.testing.assert_array_equal(unpack_encodings(doc["face_centroid_blob"])[0], centroid)
+
+
+def test_missing_centroid_is_computed(monkeypatch):
+    enrolled = np.random.default_rng(1).normal(0, 0.1, (3, 128)).astype(np.float32)
+    employees = tenant_collection("acme", "employees")
+    employees.insert_one({"organization": "acme", "employee_id": "E1", "employee_name": "Alice",
+                          "face_encodings": enrolled.tolist()})
+
+    run(monkeypatch)
+
+    doc = employees.find_one({"employee_id": "E1"})
+    assert "face_encodings" not in doc
+    np.testing.assert_allclose(unpack_encodings(doc["face_centroid_blob"])[0], enrolled.mean(axis=0), atol=1e-6)
@@ -0,0 +1,29 @@
+"""Per-tenant index creation."""
+import threading
+
+import db
+
+
+def test_unreachable_tenant_does_not_hold_up_others(monkeypatch):
+    monkeypatch.setattr(db, "MONGO_TENANTS", {"slow": {"db": "fra_slow"}, "*": {}})
+    create_indexes = db._create_indexes
+    started, release = threading.Event(), threading.Event()
+
+    def create_or_hang(database, prefix="", names=None):
+        if database.name == "fra_slow":
+            started.set()
+            release.wait(5)  # waiting for server selection
+        return create_indexes(database, prefix, names)
+
+    monkeypatch.setattr(db, "_create_indexes", create_or_hang)
+    slow = threading.Thread(target=db.tenant_collection, args=("slow", "employees"))
+    slow.start()
+    try:
+        assert started.wait(5)
+        db.tenant_collection("acme", "employees")
+        assert db._indexed[db.tenant_placement("acme")] is None
+        assert db.tenant_placement("slow") not in db._indexed
+    finally:
+        release.set()
+        slow.join()
+    assert db._indexed[db.tenant_placement("slow")] is None
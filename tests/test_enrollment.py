@@ -0,0 +1,47 @@
+"""Photos stored by enrollments that were rejected or not saved."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db import tenant_collection
+from utils.enrollment import discard_photos, enroll_photos
+from utils.image_store import LocalImageStore
+
+
+def encoder(data):
+    """Encoding stand-in: photos starting with b"ok" pass the quality checks."""
+    return ([0.0] * 128, None) if data.startswith(b"ok") else (None, "no face found")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalImageStore(str(tmp_path))
+
+
+def enroll(photos, store):
+    with ThreadPoolExecutor(2) as pool:
+        return enroll_photos(photos, store=store, encoder=encoder, encode_pool=pool)
+
+
+def test_rejected_photos_are_not_kept(store):
+    enrollment = enroll({"front": b"ok front", "left": b"blurry left"}, store)
+
+    assert enrollment["failures"] == {"left": "no face found"}
+    assert enrollment["keys"] == enrollment["new_keys"] == [store.key_for(b"ok front")]
+    assert store.exists(store.key_for(b"ok front"))
+    assert not store.exists(store.key_for(b"blurry left"))
+
+
+def test_photos_stored_before_are_not_new(store):
+    store.put(b"ok front")
+    enrollment = enroll({"front": b"ok front", "left": b"ok left"}, store)
+    assert enrollment["new_keys"] == [store.key_for(b"ok left")]
+
+
+def test_discard_keeps_photos_an_employee_references(store):
+    saved, unsaved = store.put(b"ok saved"), store.put(b"ok unsaved")
+    tenant_collection("acme", "employees").insert_one({"organization": "acme", "employee_id": "E1", "image_keys": [saved]})
+
+    discard_photos("acme", [saved, unsaved], store=store)
+    assert store.exists(saved)
+    assert not store.exists(unsaved)
@@ -0,0 +1,261 @@
+"""utils.face_utils' gallery cache against mongomock (see conftest.py).
+
+Run from the repo root: python -m pytest tests
+"""
+import os
+
+import numpy as np
+import pytest
+
+import utils.face_utils as face_utils
+from db import tenant_collection
+from utils.encoding_store import pack_encodings
+from utils.gallery import GalleryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Organizations whose gallery was loaded from Mongo, in order."""
+    loaded = []
+    load_employees = face_utils._load_employees
+
+    def record(organization):
+        loaded.append(organization)
+        return load_employees(organization)
+
+    monkeypatch.setattr(face_utils, "_load_employees", record)
+    return loaded
+
+
+@pytest.fixture
+def ivf_tenant(tmp_path, monkeypatch):
+    monkeypatch.setattr(face_utils, "FACE_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(face_utils, "FACE_INDEX_TENANTS", {"ivf": {"backend": "ivf", "n_probe": 2}})
+    return "ivf"
+
+
+def make_cache(clock, **kwargs):
+    return GalleryCache(face_utils._build_gallery, face_utils._gallery_version, clock=clock, **kwargs)
+
+
+@pytest.fixture
+def process_cache(clock, monkeypatch):
+    """A fresh face_utils.gallery_cache, as in a newly started process."""
+    cache = make_cache(clock)
+    monkeypatch.setattr(face_utils, "gallery_cache", cache)
+    return cache
+
+
+def insert_employee(organization, employee_id, seed=0):
+    """Inserts an employee the way registration does; returns the document."""
+    encodings = np.random.default_rng(seed).normal(0, 0.1, (2, 128)).astype(np.float32)
+    employee = {
+        "organization": organization,
+        "employee_id": employee_id,
+        "employee_name": f"Employee {employee_id}",
+        "face_encodings_blob": pack_encodings(encodings),
+    }
+    tenant_collection(organization, "employees").insert_one(employee)
+    return employee, encodings
+
+
+def test_miss_then_hit(clock, builds):
+    _, encodings = insert_employee("acme", "E1")
+    cache = make_cache(clock)
+
+    gallery = cache.get("acme")
+    assert cache.get("acme") is gallery
+    assert builds == ["acme"]
+    assert cache.stats["misses"] == 1 and cache.stats["hits"] == 1
+
+    (emp, distance), = gallery.match(encodings[:1], tolerance=0.4)
+    assert emp["employee_id"] == "E1" and distance < 1e-3
+
+
+def test_version_token_changes_with_every_insert():
+    assert face_utils._gallery_version("acme") == "0:"
+    insert_employee("acme", "E1")
+    first = face_utils._gallery_version("acme")
+    insert_employee("acme", "E2", seed=1)
+    second = face_utils._gallery_version("acme")
+    assert first.startswith("1:") and second.startswith("2:") and first != second
+
+
+def test_change_is_picked_up_after_check_interval(clock, builds):
+    insert_employee("acme", "E1")
+    cache = make_cache(clock, check_interval=5, ttl=300)
+    cache.get("acme")
+
+    insert_employee("acme", "E2", seed=1)
+    clock.now += 1
+    assert len(cache.get("acme")) == 2  # still trusted inside check_interval
+    assert builds == ["acme"]
+
+    clock.now += 5
+    assert len(cache.get("acme")) == 4
+    assert builds == ["acme", "acme"]
+    assert cache.stats["stale"] == 1
+
+
+def test_unchanged_version_keeps_the_entry(clock, builds):
+    insert_employee("acme", "E1")
+    cache = make_cache(clock, check_interval=5, ttl=300)
+    gallery = cache.get("acme")
+
+    clock.now += 10
+    assert cache.get("acme") is gallery
+    assert builds == ["acme"]
+
+
+def test_ttl_forces_a_reload(clock, builds):
+    insert_employee("acme", "E1")
+    cache = make_cache(clock, check_interval=5, ttl=60)
+    cache.get("acme")
+
+    clock.now += 61
+    cache.get("acme")
+    assert builds == ["acme", "acme"]
+    assert cache.stats["stale"] == 1
+
+
+def test_least_recently_used_is_evicted(clock, builds):
+    for i, org in enumerate(("a", "b", "c")):
+        insert_employee(org, "E1", seed=i)
+    cache = make_cache(clock, max_entries=2)
+
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")  # b is now the least recently used
+    cache.get("c")
+    assert cache.stats["evictions"] == 1
+    assert cache.peek("b") == (None, None)
+    assert cache.peek("a")[0] is not None
+
+    cache.get("a")
+    assert builds == ["a", "b", "c"]
+
+
+def test_invalidate(clock, builds):
+    insert_employee("acme", "E1")
+    insert_employee("other", "E1", seed=1)
+    cache = make_cache(clock)
+    cache.get("acme")
+    cache.get("other")
+
+    cache.invalidate("acme")
+    cache.get("acme")
+    cache.get("other")
+    assert builds == ["acme", "other", "acme"]
+
+    cache.invalidate()
+    assert cache.peek("acme") == (None, None) and cache.peek("other") == (None, None)
+    assert cache.stats["invalidations"] == 2
+
+
+def test_load_racing_with_invalidate_is_not_cached(clock):
+    insert_employee("acme", "E1")
+    cache = make_cache(clock)
+
+    def build_then_invalidate(organization, version):
+        gallery = face_utils._build_gallery(organization, version)
+        cache.invalidate(organization)  # an employee saved while this load was running
+        return gallery
+
+    cache._build = build_then_invalidate
+    cache.get("acme")
+    assert cache.peek("acme") == (None, None)
+
+
+def test_new_employee_extends_the_cached_gallery(process_cache, builds):
+    insert_employee("acme", "E1")
+    face_utils.get_gallery("acme")
+
+    employee, encodings = insert_employee("acme", "E2", seed=1)
+    face_utils.add_employee_to_gallery("acme", employee)
+
+    gallery, version = process_cache.peek("acme")
+    assert version == face_utils._gallery_version("acme")
+    assert face_utils.get_gallery("acme") is gallery
+    assert builds == ["acme"]
+    (emp, _), = gallery.match(encodings[:1], tolerance=0.4)
+    assert emp["employee_id"] == "E2"
+
+
+def test_gallery_missing_an_insert_is_dropped(process_cache, builds):
+    insert_employee("acme", "E1")
+    face_utils.get_gallery("acme")
+
+    insert_employee("acme", "E2", seed=1)  # saved by another process
+    employee, _ = insert_employee("acme", "E3", seed=2)
+    face_utils.add_employee_to_gallery("acme", employee)
+
+    assert process_cache.peek("acme") == (None, None)
+    assert len(face_utils.get_gallery("acme")) == 6
+    assert builds == ["acme", "acme"]
+
+
+def test_persisted_index_is_extended_and_reused(ivf_tenant, process_cache, builds, clock, monkeypatch):
+    for i in range(4):
+        insert_employee(ivf_tenant, f"E{i}", seed=i)
+    face_utils.get_gallery(ivf_tenant)
+    assert os.path.exists(face_utils.index_path(ivf_tenant))
+
+    employee, encodings = insert_employee(ivf_tenant, "E4", seed=4)
+    face_utils.add_employee_to_gallery(ivf_tenant, employee)
+
+    # A restarted process loads the extended index from disk instead of Mongo
+    monkeypatch.setattr(face_utils, "gallery_cache", make_cache(clock))
+    gallery = face_utils.get_gallery(ivf_tenant)
+    assert builds == [ivf_tenant]
+    assert gallery.index.kind == "ivf" and len(gallery) == 10
+    (emp, _), = gallery.match(encodings[:1], tolerance=0.4)
+    assert emp["employee_id"] == "E4"
+
+
+def test_outgrown_index_is_retrained_off_the_request(ivf_tenant, process_cache, monkeypatch):
+    insert_employee(ivf_tenant, "E0")
+    trained = face_utils.get_gallery(ivf_tenant)
+    assert trained.index.trained_rows == 2
+
+    retrains = []
+    monkeypatch.setattr(face_utils.threading, "Thread", lambda target, args, **kwargs: Deferred(retrains, target, args))
+    employee, _ = insert_employee(ivf_tenant, "E1", seed=1)
+    face_utils.add_employee_to_gallery(ivf_tenant, employee)
+    employee, _ = insert_employee(ivf_tenant, "E2", seed=2)
+    face_utils.add_employee_to_gallery(ivf_tenant, employee)
+
+    # The request only appended to the buckets, and started one re-train
+    extended, version = process_cache.peek(ivf_tenant)
+    assert len(extended) == 6 and extended.index.trained_rows == 2
+    assert len(retrains) == 1
+
+    retrains[0].run()
+    retrained, retrained_version = process_cache.peek(ivf_tenant)
+    assert retrained_version == version and retrained.index.trained_rows == 6
+    assert not face_utils._retraining
+
+
+class Deferred:
+    """Stands in for the re-training thread; run() runs it in the test."""
+
+    def __init__(self, started, target, args):
+        self.started, self.target, self.args = started, target, args
+
+    def start(self):
+        self.started.append(self)
+
+    def run(self):
+        self.target(*self.args)
@@ -0,0 +1,53 @@
+"""Counters and gauges alongside the stage histograms."""
+import json
+
+from utils import metrics
+from utils.metrics import Registry, render_prometheus
+
+
+def test_counters_and_gauges_are_dumped_and_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    other = Registry()
+    other.inc("cache_hits", 3, cache="gallery")
+    other.gauge("queue_pending", lambda: 7)
+    # What another process (pid 1) dumped
+    (tmp_path / "metrics-1.json").write_text(json.dumps(other.snapshot()))
+
+    monkeypatch.setattr(metrics, "registry", Registry())
+    metrics.count("cache_hits", cache="gallery")
+    metrics.gauge("queue_pending", lambda: 2)
+
+    merged = metrics.collect()
+    assert merged["counters"] == {'cache_hits{cache="gallery"}': 4}
+    assert merged["gauges"] == {"queue_pending": 7}
+
+
+def test_prometheus_exposition():
+    registry = Registry()
+    registry.observe("encode", 0.002)
+    registry.inc("cache_hits", cache="gallery")
+    registry.inc("cache_hits", 2, cache="encodings")
+    registry.gauge("queue_pending", lambda: 5)
+
+    text = render_prometheus(registry.snapshot())
+    assert 'fra_stage_seconds_count{stage="encode"} 1' in text
+    assert "# TYPE fra_cache_hits_total counter" in text
+    assert 'fra_cache_hits_total{cache="encodings"} 2' in text
+    assert 'fra_cache_hits_total{cache="gallery"} 1' in text
+    assert "# TYPE fra_queue_pending gauge\nfra_queue_pending 5" in text
+
+
+def test_cache_counts_reach_the_registry():
+    from utils.recognition_cache import EncodingCache
+
+    cache = EncodingCache(max_entries=1, name="test_encodings")
+    before = dict(metrics.registry.snapshot()["counters"])
+    cache.get("a")
+    cache.put("a", [])
+    cache.get("a")
+    cache.put("b", [])
+
+    counters = metrics.registry.snapshot()["counters"]
+    for stat in ("hits", "misses", "evictions"):
+        series = f'cache_{stat}{{cache="test_encodings"}}'
+        assert counters[series] - before.get(series, 0) == 1
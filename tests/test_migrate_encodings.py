@@ -0,0 +1,24 @@
+"""Packing legacy encoding fields into face_encodings_blob."""
+import numpy as np
+
+from scripts.migrate_encodings import migrated_document
+from utils.encoding_store import pack_encodings, unpack_encodings
+
+
+def test_existing_blob_is_kept_alongside_legacy_fields():
+    rng = np.random.default_rng(0)
+    blob, nested, single = rng.normal(0, 0.1, (2, 128)), rng.normal(0, 0.1, (1, 128)), rng.normal(0, 0.1, 128)
+    doc = {
+        "employee_id": "E1",
+        "face_encodings_blob": pack_encodings(blob),
+        "face_encodings": nested.tolist(),
+        "face_encoding": single.tolist(),
+    }
+
+    migrated = migrated_document(doc, "float32")
+    assert "face_encodings" not in migrated and "face_encoding" not in migrated
+    np.testing.assert_allclose(unpack_encodings(migrated["face_encodings_blob"]), np.vstack([blob, nested, single]), atol=1e-6)
+
+
+def test_document_without_encodings_gets_no_blob():
+    assert migrated_document({"employee_id": "E1", "face_encodings": []}, "float32") == {"employee_id": "E1"}
@@ -0,0 +1,16 @@
+"""RecentMatchCache lookups."""
+import numpy as np
+
+from utils.recognition_cache import RecentMatchCache
+
+
+def test_lookup_radius_is_capped_by_tolerance():
+    gallery = object()
+    cache = RecentMatchCache(radius=0.25)
+    known = np.zeros(128, dtype=np.float32)
+    cache.remember("acme", gallery, [known], [{"employee_id": "E1"}])
+
+    nearby = known.copy()
+    nearby[0] = 0.2
+    assert cache.lookup("acme", gallery, [nearby])[0]["employee_id"] == "E1"
+    assert cache.lookup("acme", gallery, [nearby], tolerance=0.1) == [None]
@@ -0,0 +1,226 @@
+from datetime import datetime, timedelta
+
+import pytz
+from pymongo.errors import BulkWriteError
+
+from db import tenant_collection
+from utils.metrics import span
+
+TIMEZONE = pytz.timezone("Asia/Kolkata")
+
+# IN on the first log of the day, OUT on the second, nothing after that
+ATTENDANCE_TYPES = ("IN", "OUT")
+DUPLICATE_KEY = 11000
+
+
+def attendance_slot_id(organization, employee_id, date, attendance_type):
+    """Deterministic _id of an attendance entry, so each IN/OUT slot can only be written once."""
+    return f"{organization}:{employee_id}:{date}:{attendance_type}"
+
+
+def _logged_state(organization, employee_ids, dates):
+    """Returns {(employee_id, date): [number of logs, latest time]} with a single aggregation.
+
+    latest is in seconds, or None when no entry has a time (legacy documents).
+    """
+    pipeline = [
+        {"$match": {
+            "organization": organization,
+            "employee_id": {"$in": list(employee_ids)},
+            "date": {"$in": list(dates)},
+        }},
+        {"$group": {
+            "_id": {"employee_id": "$employee_id", "date": "$date"},
+            "count": {"$sum": 1},
+            "latest": {"$max": "$time"},
+        }},
+    ]
+    return {
+        (row["_id"]["employee_id"], row["_id"]["date"]): [row["count"], _seconds(row["latest"]) if row["latest"] else None]
+        for row in tenant_collection(organization, "attendance").aggregate(pipeline)
+    }
+
+
+def _seconds(hms):
+    h, m, s = hms.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def record_attendance_events(events, organization, coalesce=timedelta(0)):
+    """Marks attendance for a batch of (employee, timestamp) events.
+
+    employee is a dict with employee_id and employee_name, as returned by the
+    face matcher. Today's state of every employee involved is read with one
+    aggregation, IN/OUT is decided in memory in timestamp order, and all new
+    entries are written with one insert_many. An event within `coalesce` of
+    the employee's latest entry that day is the same check-in and is
+    dropped, so replaying an event never turns it into an OUT. An event
+    older than that latest entry (e.g. from a delayed flush) comes too
+    late to decide IN/OUT and is skipped. Returns (marked, skipped) lists
+    of employee names.
+    """
+    events = sorted(events, key=lambda event: event[1])
+    if not events:
+        return [], []
+
+    keys = {(emp["employee_id"], ts.strftime("%Y-%m-%d")) for emp, ts in events}
+    with span("attendance_state"):
+        state = _logged_state(organization, {k[0] for k in keys}, {k[1] for k in keys})
+    window = coalesce.total_seconds()
+
+    docs = []
+    marked = []
+    skipped = []
+    seen = set()
+
+    for emp, ts in events:
+        date = ts.strftime("%Y-%m-%d")
+        key = (emp["employee_id"], date)
+
+        # The same person twice in one photo is a single check-in
+        if (key, ts) in seen:
+            continue
+        seen.add((key, ts))
+
+        logged, latest = state.get(key, (0, None))
+        seconds = _seconds(ts.strftime("%H:%M:%S"))
+        if latest is not None and abs(seconds - latest) <= window:
+            continue
+        if logged >= len(ATTENDANCE_TYPES) or (latest is not None and seconds < latest):
+            skipped.append(emp["employee_name"])
+            continue
+
+        attendance_type = ATTENDANCE_TYPES[logged]
+        state[key] = [logged + 1, seconds]
+        docs.append({
+            "_id": attendance_slot_id(organization, emp["employee_id"], date, attendance_type),
+            "employee_id": emp["employee_id"],
+            "employee_name": emp["employee_name"],
+            "organization": organization,
+            "date": date,
+            "time": ts.strftime("%H:%M:%S"),
+            "type": attendance_type
+        })
+        marked.append(emp["employee_name"])
+
+    if docs:
+        # Unordered so one already-taken slot does not block the rest of the batch
+        try:
+            with span("attendance_write"):
+                tenant_collection(organization, "attendance").insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err["code"] != DUPLICATE_KEY for err in errors):
+                raise
+
+            # Someone else (e.g. a double click) already wrote these slots
+            for err in sorted(errors, key=lambda err: err["index"], reverse=True):
+                name = docs[err["index"]]["employee_name"]
+                marked.pop(err["index"])
+                skipped.append(name)
+
+    return marked, skipped
+
+
+def mark_attendance(employees, organization, now=None):
+    """Marks attendance right now for every recognized employee. Returns (marked, skipped) names."""
+    now = now or datetime.now(TIMEZONE)
+    return record_attendance_events([(emp, now) for emp in employees], organization)
+
+
+class AttendanceDebouncer:
+    """Turns repeated sightings into one attendance event per employee per cooldown window."""
+
+    def __init__(self, cooldown=timedelta(minutes=1)):
+        self.cooldown = cooldown
+        self._last_seen = {}  # employee_id -> time of the last sighting
+
+    def seen(self, employee, when):
+        """Records a sighting. Returns True if it should become an attendance event."""
+        last = self._last_seen.get(employee["employee_id"])
+        self._last_seen[employee["employee_id"]] = when
+        return last is None or when - last > self.cooldown
+
+# ---------- VIEWER QUERIES ----------
+VIEW_PROJECTION = {"_id": 0, "employee_id": 1, "employee_name": 1, "date": 1, "time": 1, "type": 1}
+
+
+def attendance_filter(organization, employee_name=None, date=None, start_date=None, end_date=None):
+    """Mongo filter for an organization's attendance, optionally narrowed to one employee and/or dates ("%Y-%m-%d")."""
+    query = {"organization": organization}
+    if employee_name:
+        query["employee_name"] = employee_name
+    if date:
+        query["date"] = date
+    elif start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lte"] = end_date
+    return query
+
+
+def attendance_employee_names(organization):
+    """Names of every employee with at least one attendance entry, sorted."""
+    return sorted(tenant_collection(organization, "attendance").distinct("employee_name", {"organization": organization}))
+
+
+def find_attendance(organization, employee_name=None, date=None, page=0, page_size=50):
+    """Returns (rows, total) for one page of attendance logs, newest first."""
+    query = attendance_filter(organization, employee_name, date)
+    attendance = tenant_collection(organization, "attendance")
+    total = attendance.count_documents(query)
+    rows = list(
+        attendance.find(query, VIEW_PROJECTION)
+        .sort([("date", -1), ("time", -1)])
+        .skip(page * page_size)
+        .limit(page_size)
+    )
+    return rows, total
+
+
+def daily_summary(organization, employee_name=None, date=None, page=0, page_size=50):
+    """Returns (rows, total) of per-employee, per-day summaries: first IN, last OUT and hours worked."""
+    query = attendance_filter(organization, employee_name, date)
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"employee_id": "$employee_id", "date": "$date"},
+            "employee_name": {"$first": "$employee_name"},
+            "first_in": {"$min": {"$cond": [{"$eq": ["$type", "IN"]}, "$time", None]}},
+            "last_out": {"$max": {"$cond": [{"$eq": ["$type", "OUT"]}, "$time", None]}},
+        }},
+        {"$sort": {"_id.date": -1, "employee_name": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "rows": [
+                {"$skip": page * page_size},
+                {"$limit": page_size},
+                {"$project": {
+                    "_id": 0,
+                    "employee_id": "$_id.employee_id",
+                    "employee_name": 1,
+                    "date": "$_id.date",
+                    "first_in": 1,
+                    "last_out": 1,
+                }},
+            ],
+        }},
+    ]
+    result = next(tenant_collection(organization, "attendance").aggregate(pipeline))
+    rows = result["rows"]
+
+    for row in rows:
+        row["hours_worked"] = _hours_between(row.get("first_in"), row.get("last_out"))
+
+    total = result["total"][0]["n"] if result["total"] else 0
+    return rows, total
+
+
+def _hours_between(start, end):
+    if not start or not end:
+        return None
+    start_t = datetime.strptime(start, "%H:%M:%S")
+    end_t = datetime.strptime(end, "%H:%M:%S")
+    return round((end_t - start_t).total_seconds() / 3600, 2)
@@ -0,0 +1,276 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo.errors import ConnectionFailure
+
+from resources import shared
+from utils.attendance import record_attendance_events
+from utils.background import BackgroundLoop
+from utils.metrics import count, gauge, span
+
+ATTENDANCE_QUEUE_PATH = os.getenv("ATTENDANCE_QUEUE_PATH", ".attendance_queue.sqlite3")
+
+# Sightings of the same employee closer than this become one check-in
+# (two clerks photographing the same person, a double submit)
+COALESCE_SECONDS = float(os.getenv("ATTENDANCE_COALESCE_SECONDS", "60"))
+
+FLUSH_BATCH = 500     # events written to Mongo per flush
+FLUSH_LINGER = 0.05   # seconds the writer waits after a wake-up so a burst lands in one flush
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+WRITER_LEASE = 30.0   # seconds; only the lease holder flushes a queue file
+# Failed writes (other than Mongo being unreachable) before the events are
+# written one by one and the ones still failing move to dead_letter
+MAX_ATTEMPTS = int(os.getenv("ATTENDANCE_MAX_ATTEMPTS", "8"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    organization TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    employee_name TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY,
+    organization TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    employee_name TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    failed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS writer (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class AttendanceQueue(BackgroundLoop):
+    """Durable local queue of attendance events, written to Mongo behind.
+
+    enqueue() commits the events to a SQLite file and returns; the caller
+    can acknowledge right away. A background thread takes due events in
+    arrival order, groups them per organization and marks them with
+    record_attendance_events: one state read and one insert per
+    organization and flush, IN/OUT decided in timestamp order, and
+    sightings within `coalesce` of each other merged per (employee, date).
+    Events are deleted only after their write succeeded; failures are
+    retried with exponential backoff, and replaying an event that was
+    already written is a no-op. While Mongo is unreachable retries go on
+    indefinitely; any other error is retried max_attempts times, then the
+    events are written one by one and those that still fail are moved to
+    the dead_letter table (see requeue_dead_letters), so one bad event
+    can't hold back its organization forever. Several processes may share
+    the file: a lease lets one of them flush at a time.
+    """
+
+    label = "Attendance Queue"
+
+    def __init__(self, path=ATTENDANCE_QUEUE_PATH, coalesce=timedelta(seconds=COALESCE_SECONDS),
+                 batch_size=FLUSH_BATCH, linger=FLUSH_LINGER, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, max_attempts=MAX_ATTEMPTS, clock=time.time):
+        super().__init__()
+        self.path = path
+        self.coalesce = coalesce
+        self.batch_size = batch_size
+        self.linger = linger
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.stats = {"enqueued": 0, "flushes": 0, "marked": 0, "skipped": 0, "coalesced": 0, "failed_attempts": 0,
+                      "dead_lettered": 0}
+        self._owner = uuid.uuid4().hex
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db().executescript(SCHEMA)
+        gauge("attendance_queue_pending", self.pending)
+        gauge("attendance_queue_dead_letters", self.dead_letters)
+
+    def _db(self):
+        """This thread's connection (sqlite3 connections can't be shared between threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # a committed event survives a power loss
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, events, organization):
+        """Durably queues (employee, timestamp) events. Returns how many."""
+        rows = [
+            (organization, emp["employee_id"], emp["employee_name"], ts.isoformat())
+            for emp, ts in events
+        ]
+        if not rows:
+            return 0
+        with span("attendance_enqueue"):
+            conn = self._db()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT INTO events (organization, employee_id, employee_name, ts) VALUES (?, ?, ?, ?)", rows
+                )
+        self._count("enqueued", len(rows))
+        self.wake()
+        return len(rows)
+
+    def pending(self, organization=None):
+        """Number of events not written to Mongo yet."""
+        if organization is None:
+            return self._db().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return self._db().execute("SELECT COUNT(*) FROM events WHERE organization = ?", (organization,)).fetchone()[0]
+
+    def dead_letters(self, organization=None):
+        """Number of events given up on, waiting in dead_letter."""
+        if organization is None:
+            return self._db().execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return self._db().execute(
+            "SELECT COUNT(*) FROM dead_letter WHERE organization = ?", (organization,)
+        ).fetchone()[0]
+
+    def requeue_dead_letters(self, organization=None):
+        """Moves dead-lettered events back into the queue (once the cause is fixed). Returns how many."""
+        where, params = ("WHERE organization = ?", (organization,)) if organization is not None else ("", ())
+        conn = self._db()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            moved = conn.execute(
+                "INSERT INTO events (organization, employee_id, employee_name, ts) "
+                f"SELECT organization, employee_id, employee_name, ts FROM dead_letter {where} ORDER BY id", params
+            ).rowcount
+            conn.execute(f"DELETE FROM dead_letter {where}", params)
+        self.wake()
+        return moved
+
+    def _take_lease(self):
+        now = self.clock()
+        conn = self._db()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires FROM writer WHERE id = 1").fetchone()
+            if row is not None and row[0] != self._owner and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO writer (id, owner, expires) VALUES (1, ?, ?)", (self._owner, now + WRITER_LEASE)
+            )
+        return True
+
+    def flush_once(self):
+        """Writes up to batch_size due events. Returns how many were taken."""
+        if not self._take_lease():
+            return 0
+        conn = self._db()
+        now = self.clock()
+        # An organization waiting on a retry is held back whole, so its later
+        # events can't be written before its earlier ones
+        rows = conn.execute(
+            "SELECT id, organization, employee_id, employee_name, ts, attempts FROM events "
+            "WHERE organization NOT IN (SELECT organization FROM events WHERE next_try > ?) "
+            "ORDER BY id LIMIT ?",
+            (now, self.batch_size),
+        ).fetchall()
+        if not rows:
+            return 0
+
+        by_org = defaultdict(list)
+        for row in rows:
+            by_org[row[1]].append(row)
+
+        for organization, org_rows in by_org.items():
+            attempts = max(row[5] for row in org_rows) + 1
+            try:
+                with span("attendance_flush"):
+                    self._write(organization, org_rows)
+            except Exception as e:
+                if attempts >= self.max_attempts and not isinstance(e, ConnectionFailure):
+                    self._write_one_by_one(organization, org_rows, attempts)
+                else:
+                    self._retry_later(organization, org_rows, attempts, e)
+        return len(rows)
+
+    def _write(self, organization, org_rows):
+        """Marks the rows' events and deletes them from the queue."""
+        events = [
+            ({"employee_id": employee_id, "employee_name": name}, datetime.fromisoformat(ts))
+            for _, _, employee_id, name, ts, _ in org_rows
+        ]
+        marked, skipped = record_attendance_events(events, organization, coalesce=self.coalesce)
+
+        conn = self._db()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM events WHERE id = ?", [(row[0],) for row in org_rows])
+        with self._lock:
+            self.stats["flushes"] += 1
+            self.stats["marked"] += len(marked)
+            self.stats["skipped"] += len(skipped)
+            self.stats["coalesced"] += len(events) - len(marked) - len(skipped)
+
+    def _retry_later(self, organization, org_rows, attempts, error):
+        next_try = self.clock() + min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        conn = self._db()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "UPDATE events SET attempts = ?, next_try = ?, error = ? WHERE id = ?",
+                [(attempts, next_try, str(error), row[0]) for row in org_rows],
+            )
+        self._count("failed_attempts")
+        print(f"[Attendance Queue Error] {organization}: {error} (attempt {attempts}, {len(org_rows)} events)")
+
+    def _write_one_by_one(self, organization, org_rows, attempts):
+        """Last try for events that kept failing: each on its own, in order, dead-lettering the ones that fail."""
+        conn = self._db()
+        for i, row in enumerate(org_rows):
+            try:
+                self._write(organization, [row])
+            except ConnectionFailure as e:
+                self._retry_later(organization, org_rows[i:], attempts, e)
+                return
+            except Exception as e:
+                with conn:
+                    conn.execute("BEGIN")
+                    conn.execute(
+                        "INSERT INTO dead_letter (id, organization, employee_id, employee_name, ts, attempts, error, failed_at) "
+                        "SELECT id, organization, employee_id, employee_name, ts, ?, ?, ? FROM events WHERE id = ?",
+                        (attempts, str(e), self.clock(), row[0]),
+                    )
+                    conn.execute("DELETE FROM events WHERE id = ?", (row[0],))
+                self._count("dead_lettered")
+                print(f"[Attendance Queue Error] {organization}: gave up on {row[2]} at {row[4]}: {e}")
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self.stats[stat] += n
+        count(f"attendance_queue_{stat}", n)
+
+    def step(self):
+        # A whole batch came back: a burst is still draining
+        return self.flush_once() >= self.batch_size
+
+    def stop(self, timeout=5):
+        super().stop(timeout)
+        with self._db() as conn:
+            conn.execute("DELETE FROM writer WHERE owner = ?", (self._owner,))
+
+
+def get_attendance_queue():
+    """The attendance queue, with its writer running."""
+    return shared("attendance_queue", lambda: AttendanceQueue(ATTENDANCE_QUEUE_PATH).start())
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class BackgroundLoop:
+    """Daemon thread that works off a queue whenever woken, and at least every `interval` seconds.
+
+    Subclasses implement step(), which processes what is due and returns
+    True while more is ready right away, and pending(), which is falsy
+    once the queue is empty. wake() is called after enqueuing.
+    """
+
+    label = "Background"      # in error messages and the thread name
+    interval = 1.0
+    linger = 0.0              # seconds to wait after a wake-up, so a burst is handled at once
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def step(self):
+        raise NotImplementedError
+
+    def pending(self):
+        raise NotImplementedError
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        """Starts the background thread (once); work left from a previous run is picked up at once."""
+        with self._thread_lock:
+            if self._thread is None:
+                name = self.label.lower().replace(" ", "-")
+                self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+                self._wake.set()
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self._wake.wait(self.interval) and self.linger:
+                self._stopped.wait(self.linger)
+            self._wake.clear()
+            try:
+                while self.step() and not self._stopped.is_set():
+                    pass
+            except Exception as e:
+                print(f"[{self.label} Error]: {e}")
+
+    def drain(self, timeout=None, poll_interval=0.02):
+        """Waits until nothing is pending. Returns True when drained before the timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            self._wake.set()
+            time.sleep(poll_interval)
+        return True
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import time
+import zipfile
+from collections import deque
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from utils.attendance import TIMEZONE, AttendanceDebouncer, record_attendance_events
+from utils.recognition_worker import WorkerBusy
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_IFD = 0x8769
+# e.g. IMG_20240513_091502.jpg, gate-2024-05-13 09.15.02.png
+FILENAME_TIMESTAMP = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})[ _T-]?(\d{2})[.:-]?(\d{2})[.:-]?(\d{2})")
+
+
+def iter_source(path):
+    """Yields (name, open_file, fallback_time) for every image in a folder or zip archive.
+
+    fallback_time is the file time: an aware datetime for files on disk,
+    and naive wall-clock time for zip entries (zip stores no timezone).
+    """
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        for info in archive.infolist():
+            if info.filename.lower().endswith(IMAGE_EXTENSIONS) and not info.is_dir():
+                yield info.filename, (lambda info=info: archive.open(info)), datetime(*info.date_time)
+        return
+
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                full = os.path.join(root, name)
+                rel = os.path.relpath(full, path)
+                yield rel, (lambda full=full: open(full, "rb")), datetime.fromtimestamp(os.path.getmtime(full), TIMEZONE)
+
+
+def image_timestamp(name, open_file, fallback):
+    """When a still was taken: EXIF DateTimeOriginal, else a timestamp in the file name, else the file time."""
+    try:
+        # Only the image header is read here, not the pixel data
+        with open_file() as f:
+            exif = Image.open(f).getexif()
+        value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL)
+        if value:
+            return TIMEZONE.localize(datetime.strptime(value, "%Y:%m:%d %H:%M:%S"))
+    except Exception:
+        pass
+
+    found = FILENAME_TIMESTAMP.search(os.path.basename(name))
+    if found:
+        try:
+            return TIMEZONE.localize(datetime(*map(int, found.groups())))
+        except ValueError:
+            pass
+
+    # A file's mtime is already an instant; naive times are taken as local wall-clock time
+    return fallback.astimezone(TIMEZONE) if fallback.tzinfo else TIMEZONE.localize(fallback)
+
+
+class Checkpoint:
+    """Names of images already imported, saved as JSON after every committed chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f)["done"])
+
+    def save(self, names):
+        self.done.update(names)
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.items = {}
+
+    def add(self, stage, seconds, items=1):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.items[stage] = self.items.get(stage, 0) + items
+
+    def report(self):
+        lines = []
+        for stage, seconds in self.seconds.items():
+            rate = self.items[stage] / seconds if seconds else float("inf")
+            lines.append(f"{stage:>10}: {self.items[stage]:>7} in {seconds:7.1f}s ({rate:.1f}/s)")
+        return "\n".join(lines)
+
+
+def import_attendance(source, organization, pool, checkpoint=None, chunk_size=200, tolerance=0.4,
+                      cooldown=timedelta(minutes=5), log=print):
+    """Replays a folder or zip of timestamped stills into attendance.
+
+    Images are read and time-stamped, sent through the recognition worker
+    pool (keeping it full, but not beyond its backpressure limit), and the
+    resulting events are written in chunks, oldest first, with the image
+    time deciding IN/OUT. Consecutive stills of the same person within
+    cooldown count as one sighting, also when the other sighting is an
+    entry already stored (a live check-in, an earlier import). Each
+    written chunk is recorded in the checkpoint, so an interrupted import
+    resumes where it stopped.
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    debouncer = AttendanceDebouncer(cooldown)
+    timer = StageTimer()
+
+    # Stage 1: time-stamp everything not imported yet (image headers only)
+    start = time.perf_counter()
+    images = []
+    for name, open_file, fallback in iter_source(source):
+        if name not in checkpoint.done:
+            images.append((image_timestamp(name, open_file, fallback), name, open_file))
+    images.sort(key=lambda image: image[0])
+    timer.add("scan", time.perf_counter() - start, len(images))
+    log(f"{len(images)} image(s) to import ({len(checkpoint.done)} already done)")
+
+    totals = {"images": 0, "marked": 0, "skipped": 0}
+    for offset in range(0, len(images), chunk_size):
+        chunk = images[offset:offset + chunk_size]
+
+        # Stage 2: recognition, as many jobs in flight as the pool accepts
+        start = time.perf_counter()
+        results = [None] * len(chunk)
+        pending = deque(enumerate(chunk))
+        in_flight = []
+        data = None
+        while pending or in_flight:
+            while pending:
+                i, (_, _, open_file) = pending[0]
+                if data is None:
+                    with open_file() as f:
+                        data = f.read()
+                try:
+                    in_flight.append((i, pool.submit(data, organization, tolerance)))
+                except WorkerBusy:
+                    break
+                pending.popleft()
+                data = None
+            if not in_flight:
+                time.sleep(0.1)  # the pool is busy with other callers
+                continue
+            i, future = in_flight.pop(0)
+            results[i] = pool.wait(future)
+        timer.add("recognize", time.perf_counter() - start, len(chunk))
+
+        # Stage 3: one bulk write for the whole chunk
+        start = time.perf_counter()
+        events = [
+            (emp, ts)
+            for (ts, _, _), employees in zip(chunk, results)
+            for emp in employees
+            if debouncer.seen(emp, ts)
+        ]
+        marked, skipped = record_attendance_events(events, organization, coalesce=cooldown)
+        timer.add("write", time.perf_counter() - start, len(events))
+
+        checkpoint.save(name for _, name, _ in chunk)
+        totals["images"] += len(chunk)
+        totals["marked"] += len(marked)
+        totals["skipped"] += len(skipped)
+        log(f"{totals['images']}/{len(images)} images, {totals['marked']} marked, {totals['skipped']} skipped")
+
+    log(timer.report())
+    return totals
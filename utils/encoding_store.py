@@ -0,0 +1,35 @@
+import os
+import struct
+
+import numpy as np
+from bson.binary import Binary
+
+# Packed layout: header (magic, format version, dtype code, count, dim) + row-major values
+HEADER = struct.Struct("<2sBBHH")
+MAGIC = b"FE"
+FORMAT_VERSION = 1
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+ENCODING_DTYPE = os.getenv("ENCODING_DTYPE", "float32")  # or float16 to halve storage
+
+
+def pack_encodings(encodings, dtype=None):
+    """Packs an employee's encodings into one BSON Binary blob."""
+    dtype = np.dtype(dtype or ENCODING_DTYPE).newbyteorder("<")
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported encoding dtype: {dtype}")
+
+    matrix = np.asarray(encodings, dtype=dtype)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    count, dim = matrix.shape
+    return Binary(HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], count, dim) + matrix.tobytes())
+
+
+def unpack_encodings(blob):
+    """Returns a read-only (count x dim) view over a packed blob (no copy)."""
+    magic, version, dtype_code, count, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a packed face encoding blob")
+    return np.frombuffer(blob, dtype=DTYPES[dtype_code], count=count * dim, offset=HEADER.size).reshape(count, dim)
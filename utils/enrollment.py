@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from db import tenant_collection
+from resources import replace_shared, shared
+from utils.face_utils import encode_enrollment_face
+from utils.image_store import RemoteSync, get_image_store, make_remote
+
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "0")) or None  # None = one per CPU
+
+def _new_encode_pool():
+    # spawn: workers must not inherit the parent's MongoClient or server threads
+    return ProcessPoolExecutor(max_workers=ENCODE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_encode_pool():
+    """Process pool for face encoding."""
+    return shared("encode_pool", _new_encode_pool)
+
+
+def enroll_photos(photos, store=None, encoder=encode_enrollment_face, encode_pool=None):
+    """Stores and encodes an employee's labeled photos concurrently.
+
+    photos is a dict {label: image file}. Every image is read once; encoding
+    starts on the in-memory bytes right away in encode_pool (a process pool
+    by default) while the photos are written to the local image store. The
+    remote copy happens later (see queue_remote_copies). Only photos that
+    were stored and passed the quality checks are kept; rejected photos
+    this call stored are deleted again.
+
+    Returns {"encodings": [...], "keys": [...], "new_keys": [...],
+    "failures": {label: reason}}, with encodings and image store keys in
+    the order of photos; new_keys are the kept keys this call stored
+    first (see discard_photos).
+    """
+    own_pool = encode_pool is None
+    encode_pool = encode_pool or get_encode_pool()
+    store = store or get_image_store()
+    images = {label: _read_bytes(img) for label, img in photos.items()}
+
+    try:
+        encode_futures = {label: encode_pool.submit(encoder, data) for label, data in images.items()}
+    except BrokenProcessPool:
+        if not own_pool:
+            raise
+        encode_pool = _replace_encode_pool(encode_pool)
+        encode_futures = {label: encode_pool.submit(encoder, data) for label, data in images.items()}
+
+    keys = {}
+    created = set()  # keys no earlier enrollment had stored
+    for label, data in images.items():
+        try:
+            existed = store.exists(store.key_for(data))
+            keys[label] = store.put(data)
+            if not existed:
+                created.add(keys[label])
+        except OSError as e:
+            print(f"[Image Store Error for {label}]: {e}")
+
+    outcomes = _encode_results(encode_futures)
+    broken = [label for label, outcome in outcomes.items() if isinstance(outcome, BrokenProcessPool)]
+    if broken and own_pool:
+        # A worker died mid-batch: retry those photos once in a new pool
+        encode_pool = _replace_encode_pool(encode_pool)
+        try:
+            outcomes.update(_encode_results({label: encode_pool.submit(encoder, images[label]) for label in broken}))
+        except BrokenProcessPool:
+            pass
+
+    result = {"encodings": [], "keys": [], "new_keys": [], "failures": {}}
+    for label, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            result["failures"][label] = f"encoding failed: {outcome}"
+            continue
+        encoding, rejection = outcome
+
+        if label not in keys:
+            result["failures"][label] = "could not be stored"
+        elif encoding is None:
+            result["failures"][label] = rejection
+        else:
+            result["encodings"].append(encoding)
+            result["keys"].append(keys[label])
+
+    result["new_keys"] = [key for key in result["keys"] if key in created]
+    for key in created - set(result["keys"]):
+        store.delete(key)
+    return result
+
+
+def discard_photos(organization, keys, store=None):
+    """Deletes stored photos of an enrollment that was not saved, unless an employee references them."""
+    store = store or get_image_store()
+    employees = tenant_collection(organization, "employees")
+    for key in keys:
+        if employees.find_one({"organization": organization, "image_keys": key}, {"_id": 1}) is None:
+            store.delete(key)
+
+
+def _encode_results(futures):
+    """{label: (encoding, rejection), or the exception the job raised}."""
+    outcomes = {}
+    for label, future in futures.items():
+        try:
+            outcomes[label] = future.result()
+        except Exception as e:
+            outcomes[label] = e
+    return outcomes
+
+
+def _replace_encode_pool(pool):
+    print("[Encode Pool Error]: a worker died, starting a new pool")
+    new_pool = replace_shared("encode_pool", pool, _new_encode_pool)
+    if new_pool is not pool:
+        pool.shutdown(wait=False)
+    return new_pool
+
+
+def _record_remote_url(key, url, meta):
+    # image_urls fills in as the background copies land
+    tenant_collection(meta["organization"], "employees").update_one(
+        {"organization": meta["organization"], "employee_id": meta["employee_id"]},
+        {"$addToSet": {"image_urls": url}},
+    )
+
+
+def _start_image_sync():
+    remote = make_remote()
+    if remote is None:
+        return None
+    return RemoteSync(get_image_store(), remote, on_synced=_record_remote_url).start()
+
+
+def get_image_sync():
+    """Background copier of stored photos to IMAGE_REMOTE, or None when there is no remote."""
+    return shared("image_sync", _start_image_sync)
+
+
+def queue_remote_copies(organization, employee_id, keys, image_sync=None):
+    """Must be called after the employee is inserted: queues its photos for the remote store."""
+    image_sync = image_sync or get_image_sync()
+    if image_sync is None:
+        return
+    for key in keys:
+        image_sync.enqueue(key, {"organization": organization, "employee_id": employee_id})
+
+
+def _read_bytes(image_file):
+    if isinstance(image_file, bytes):
+        return image_file
+    image_file.seek(0)
+    return image_file.read()
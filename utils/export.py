@@ -0,0 +1,66 @@
+import csv
+import io
+from itertools import islice
+
+from db import tenant_collection
+from utils.attendance import attendance_filter
+
+EXPORT_COLUMNS = ["employee_id", "employee_name", "date", "time", "type"]
+EXPORT_FORMATS = ("csv", "parquet")
+BATCH_SIZE = 5000
+
+
+def iter_attendance(organization, employee_name=None, start_date=None, end_date=None, batch_size=BATCH_SIZE):
+    """Cursor over an organization's attendance in date/time order, fetched batch_size documents at a time."""
+    query = attendance_filter(organization, employee_name, start_date=start_date, end_date=end_date)
+    projection = {"_id": 0, **{col: 1 for col in EXPORT_COLUMNS}}
+    return tenant_collection(organization, "attendance").find(query, projection, batch_size=batch_size).sort([("date", 1), ("time", 1)])
+
+
+def _batches(records, batch_size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_csv(records, out, batch_size=BATCH_SIZE):
+    """Writes records to a binary file object as UTF-8 CSV. Returns the number of rows."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+
+    rows = 0
+    for batch in _batches(records, batch_size):
+        writer.writerows(batch)
+        rows += len(batch)
+
+    text.detach()  # leave `out` open for the caller
+    return rows
+
+
+def write_parquet(records, out, batch_size=BATCH_SIZE):
+    """Writes records to a path or binary file object as Parquet, one row group per batch. Returns the number of rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(col, pa.string()) for col in EXPORT_COLUMNS])
+    rows = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for batch in _batches(records, batch_size):
+            columns = {col: [row.get(col) for row in batch] for col in EXPORT_COLUMNS}
+            writer.write_table(pa.table(columns, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def export_attendance(out, fmt="csv", organization=None, employee_name=None, start_date=None, end_date=None, batch_size=BATCH_SIZE):
+    """Streams an organization's attendance into `out` without holding the whole result in memory."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+
+    records = iter_attendance(organization, employee_name, start_date, end_date, batch_size)
+    writer = write_csv if fmt == "csv" else write_parquet
+    return writer(records, out, batch_size)
@@ -0,0 +1,185 @@
+import numpy as np
+
+# An IVF index is due for re-training once it holds this many times the rows
+# its k-means last saw (an organization that started empty or small would
+# otherwise keep a handful of huge buckets)
+IVF_RETRAIN_GROWTH = 2.0
+
+
+def _sq_distances(queries, vectors, vector_sq_norms):
+    """Squared euclidean distances between every query and every vector."""
+    sq = np.einsum("ij,ij->i", queries, queries)[:, None] + vector_sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+    np.maximum(sq, 0.0, out=sq)
+    return sq
+
+
+def _top_k(sq, k):
+    """Column indices and distances of the k smallest entries of each row, nearest first."""
+    k = min(k, sq.shape[1])
+    if k < sq.shape[1]:
+        idx = np.argpartition(sq, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(sq.shape[1]), sq.shape).copy()
+    part = np.take_along_axis(sq, idx, axis=1)
+    order = np.argsort(part, axis=1)
+    return np.sqrt(np.take_along_axis(part, order, axis=1)), np.take_along_axis(idx, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force search over every stored encoding."""
+
+    kind = "exact"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self._sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    @classmethod
+    def build(cls, vectors):
+        return cls(vectors)
+
+    def extended(self, vectors):
+        """Returns a new index that also contains the given vectors (appended as new rows)."""
+        return ExactIndex(np.concatenate([self.vectors, vectors]))
+
+    def needs_retraining(self):
+        return False
+
+    def search(self, queries, k=1):
+        """Returns (distances, rows), both shaped (queries x k), nearest first."""
+        if len(self.vectors) == 0:
+            return np.full((len(queries), 1), np.inf, dtype=np.float32), np.full((len(queries), 1), -1)
+        return _top_k(_sq_distances(queries, self.vectors, self._sq_norms), k)
+
+    def state(self):
+        return {}
+
+    @classmethod
+    def from_state(cls, vectors, state):
+        return cls(vectors)
+
+
+class IVFIndex:
+    """Inverted-file index: vectors are bucketed by their nearest k-means centroid
+    and a query only scans the n_probe buckets closest to it.
+
+    trained_rows is how many vectors the centroids were trained on and
+    n_lists the requested bucket count (None sizes it from the data); both
+    are kept so extended() can re-train with the same settings.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors, centroids, assignments, n_probe=8, trained_rows=None, n_lists=None):
+        self.vectors = vectors
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.n_probe = int(n_probe)
+        self.trained_rows = len(vectors) if trained_rows is None else int(trained_rows)
+        self.n_lists = n_lists
+
+        self._sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        # Rows of each bucket, stored back to back
+        self._order = np.argsort(self.assignments, kind="stable")
+        self._bounds = np.searchsorted(self.assignments[self._order], np.arange(len(self.centroids) + 1))
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_probe=8, iterations=10, seed=0):
+        n = len(vectors)
+        requested = n_lists
+        if n_lists is None:
+            n_lists = max(1, int(2 * np.sqrt(n)))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, n_lists, replace=False)].copy() if n else np.zeros((1, vectors.shape[1]), np.float32)
+        assignments = np.zeros(n, dtype=np.int32)
+
+        # Plain Lloyd iterations; empty clusters keep their previous centroid
+        for _ in range(iterations if n else 0):
+            assignments = cls._nearest(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=len(centroids))
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        if n:
+            assignments = cls._nearest(vectors, centroids)
+        return cls(vectors, centroids, assignments, n_probe, trained_rows=n, n_lists=requested)
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        sq = _sq_distances(vectors, centroids, np.einsum("ij,ij->i", centroids, centroids))
+        return sq.argmin(axis=1).astype(np.int32)
+
+    def extended(self, vectors):
+        """Returns a new index that also contains the given vectors, assigned to the existing buckets.
+
+        This never re-trains (k-means over every vector is too slow for a
+        request); see needs_retraining().
+        """
+        all_vectors = np.concatenate([self.vectors, vectors])
+        return IVFIndex(
+            all_vectors,
+            self.centroids,
+            np.concatenate([self.assignments, self._nearest(vectors, self.centroids)]),
+            self.n_probe,
+            trained_rows=self.trained_rows,
+            n_lists=self.n_lists,
+        )
+
+    def needs_retraining(self):
+        """True once the index holds IVF_RETRAIN_GROWTH times the rows its centroids were trained on."""
+        return len(self.vectors) > max(1, self.trained_rows) * IVF_RETRAIN_GROWTH
+
+    def search(self, queries, k=1):
+        """Returns (distances, rows), both shaped (queries x k), nearest first. Missing results are -1/inf."""
+        n_probe = min(self.n_probe, len(self.centroids))
+        _, probes = _top_k(_sq_distances(queries, self.centroids, self._centroid_sq_norms), n_probe)
+
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for q, buckets in enumerate(probes):
+            candidates = np.concatenate([self._order[self._bounds[b]:self._bounds[b + 1]] for b in buckets])
+            if len(candidates) == 0:
+                continue
+            sq = _sq_distances(queries[q:q + 1], self.vectors[candidates], self._sq_norms[candidates])
+            dist, cols = _top_k(sq, k)
+            out_dist[q, :dist.shape[1]] = dist[0]
+            out_rows[q, :dist.shape[1]] = candidates[cols[0]]
+
+        return out_dist, out_rows
+
+    def state(self):
+        return {
+            "centroids": self.centroids,
+            "assignments": self.assignments,
+            "n_probe": np.array(self.n_probe),
+            "trained_rows": np.array(self.trained_rows),
+            "n_lists": np.array(-1 if self.n_lists is None else self.n_lists),
+        }
+
+    @classmethod
+    def from_state(cls, vectors, state):
+        # Files saved before re-training existed lack trained_rows and n_lists
+        trained_rows = int(state["trained_rows"]) if "trained_rows" in state else None
+        n_lists = int(state["n_lists"]) if "n_lists" in state else -1
+        return cls(vectors, state["centroids"], state["assignments"], int(state["n_probe"]),
+                   trained_rows=trained_rows, n_lists=None if n_lists < 0 else n_lists)
+
+
+INDEX_BACKENDS = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+
+def build_index(vectors, backend="exact", **params):
+    """Builds a search index of the given backend ("exact" or "ivf") over a float32 matrix."""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown face index backend: {backend!r}")
+    return INDEX_BACKENDS[backend].build(vectors, **params)
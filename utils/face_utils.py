@@ -1,51 +1,324 @@
-import face_recognition
 import numpy as np
 from PIL import Image
+import hashlib
 import io
-from db import employees_col
+import json
+import os
+import threading
+from db import tenant_collection
+from resources import face_models
+from utils.gallery import FaceGallery, GalleryCache
+from utils.metrics import span
+from utils.recognition_cache import EncodingCache, RecentMatchCache
+
+# Only the fields the matcher needs; image_urls and the rest stay in Mongo
+GALLERY_PROJECTION = {
+    "_id": 0, "employee_id": 1, "employee_name": 1,
+    "face_encodings_blob": 1, "face_centroid_blob": 1, "face_encodings": 1, "face_encoding": 1,
+}
+
+# Nearest-neighbour index per organization: "exact" (default) or "ivf".
+# FACE_INDEX_TENANTS overrides it per tenant, e.g. {"acme": {"backend": "ivf", "n_probe": 16}}
+FACE_INDEX_BACKEND = os.getenv("FACE_INDEX_BACKEND", "exact")
+FACE_INDEX_TENANTS = json.loads(os.getenv("FACE_INDEX_TENANTS", "{}"))
+FACE_INDEX_DIR = os.getenv("FACE_INDEX_DIR", ".face_index")
+
+# Employees shortlisted by centroid distance before their templates are
+# compared (0 searches every template through the index); also settable per
+# tenant as "screen" in FACE_INDEX_TENANTS
+FACE_SCREEN_CANDIDATES = int(os.getenv("FACE_SCREEN_CANDIDATES", "0"))
+
+
+def index_config(organization):
+    """Returns the index settings of an organization: {"backend": ..., "screen": ..., **params}."""
+    config = {"backend": FACE_INDEX_BACKEND, "screen": FACE_SCREEN_CANDIDATES}
+    config.update(FACE_INDEX_TENANTS.get(organization, {}))
+    return config
+
+
+def index_path(organization):
+    safe_name = hashlib.sha1(organization.encode()).hexdigest()[:16]
+    return os.path.join(FACE_INDEX_DIR, f"{safe_name}.npz")
+
+
+def _load_employees(organization):
+    with span("employees_fetch"):
+        return list(tenant_collection(organization, "employees").find({"organization": organization}, GALLERY_PROJECTION))
+
+
+def _gallery_version(organization):
+    """Cheap change token: number of employees plus the newest document id."""
+    employees = tenant_collection(organization, "employees")
+    count = employees.count_documents({"organization": organization})
+    newest = employees.find_one({"organization": organization}, {"_id": 1}, sort=[("_id", -1)])
+    return f"{count}:{newest['_id'] if newest else ''}"
+
+
+def _load_persisted(path):
+    """Returns (gallery, version) saved at path, or (None, None) when missing or unreadable."""
+    if not os.path.exists(path):
+        return None, None
+    try:
+        return FaceGallery.load(path)
+    except Exception as e:
+        # A corrupt or partial file is rebuilt (and overwritten) from Mongo
+        print(f"[Face Index Error] {path}: {e}")
+        return None, None
+
+
+def _build_gallery(organization, version):
+    """Builds the gallery of an organization; approximate indexes are persisted to disk."""
+    config = index_config(organization)
+    if config["backend"] == "exact":
+        return FaceGallery.from_employees(_load_employees(organization), **config)
+
+    path = index_path(organization)
+    gallery, saved_version = _load_persisted(path)
+    if gallery is not None and saved_version == version:
+        _retrain_if_due(organization, gallery)
+        return gallery
+
+    gallery = FaceGallery.from_employees(_load_employees(organization), **config)
+    os.makedirs(FACE_INDEX_DIR, exist_ok=True)
+    gallery.save(path, version)
+    return gallery
+
+
+_retraining = set()  # organizations whose index is being re-trained
+_retraining_lock = threading.Lock()
+
+
+def _retrain_if_due(organization, gallery):
+    """Re-trains the index in the background once it has outgrown its centroids (see IVFIndex.needs_retraining)."""
+    if not gallery.index.needs_retraining():
+        return
+    with _retraining_lock:
+        if organization in _retraining:
+            return
+        _retraining.add(organization)
+    threading.Thread(target=_retrain, args=(organization,), name="face-index-retrain", daemon=True).start()
+
+
+def _retrain(organization):
+    try:
+        version = _gallery_version(organization)
+        with span("index_retrain"):
+            gallery = FaceGallery.from_employees(_load_employees(organization), **index_config(organization))
+        # An employee added meanwhile was appended to the old index; the next one retries
+        if _gallery_version(organization) != version:
+            return
+        os.makedirs(FACE_INDEX_DIR, exist_ok=True)
+        gallery.save(index_path(organization), version)
+        gallery_cache.replace(organization, gallery, version)
+    except Exception as e:
+        print(f"[Face Index Error] re-training {organization}: {e}")
+    finally:
+        with _retraining_lock:
+            _retraining.discard(organization)
+
+
+gallery_cache = GalleryCache(_build_gallery, _gallery_version)
+
+# Recognition results: image hash -> encodings, and per-organization recent
+# matches (tied to the gallery they came from, so a gallery change drops them)
+encoding_cache = EncodingCache()
+recent_matches = RecentMatchCache()
+
+
+def get_gallery(organization):
+    """Returns the (cached) face gallery of an organization."""
+    return gallery_cache.get(organization)
+
+
+def invalidate_gallery(organization):
+    """Drops the cached gallery; the next recognition reloads it from Mongo."""
+    gallery_cache.invalidate(organization)
+    recent_matches.invalidate(organization)
+
+
+def add_employee_to_gallery(organization, employee):
+    """Must be called after an employee is inserted.
+
+    Extends the cached (and persisted) gallery with the new employee's
+    encodings instead of rebuilding the whole index; an IVF index that has
+    outgrown its centroids is re-trained in a background thread.
+    """
+    config = index_config(organization)
+    persisted = config["backend"] != "exact"
+    path = index_path(organization)
+
+    gallery, version = gallery_cache.peek(organization)
+    if gallery is None and persisted:
+        gallery, version = _load_persisted(path)
+
+    # Only extend a gallery that was current right before this insert
+    new_version = _gallery_version(organization)
+    if gallery is None or int(version.split(":")[0]) + 1 != int(new_version.split(":")[0]):
+        invalidate_gallery(organization)
+        return
+
+    gallery = gallery.extended(employee)
+    if persisted:
+        os.makedirs(FACE_INDEX_DIR, exist_ok=True)
+        gallery.save(path, new_version)
+    gallery_cache.replace(organization, gallery, new_version)
+    _retrain_if_due(organization, gallery)
+
+
+# Detection runs on a copy downscaled to this long edge (0 disables downscaling);
+# encodings are still computed on the original-resolution image
+DETECTION_MAX_EDGE = int(os.getenv("DETECTION_MAX_EDGE", "1280"))
+DETECTION_UPSAMPLE = 1
+MAX_DETECTION_UPSAMPLE = 2
+DETECTION_MODEL = os.getenv("DETECTION_MODEL", "hog")
+
+# Smallest face (in pixels of the image searched) HOG finds without upsampling
+MIN_DETECTABLE_FACE = 80
+
+
+def detect_faces(image_np, max_edge=None, upsample=None, model=None):
+    """Returns face boxes (top, right, bottom, left) in original-image coordinates.
+
+    Detection runs on a copy downscaled to max_edge. When the smallest face
+    found is close to the detection limit (typical of group shots), the
+    search is repeated with one more upsampling step to pick up smaller faces.
+    """
+    max_edge = DETECTION_MAX_EDGE if max_edge is None else max_edge
+    model = model or DETECTION_MODEL
+    height, width = image_np.shape[:2]
+
+    scale = min(1.0, max_edge / max(height, width)) if max_edge else 1.0
+    if scale < 1.0:
+        small = np.asarray(Image.fromarray(image_np).resize((round(width * scale), round(height * scale)), Image.BILINEAR))
+    else:
+        small = image_np
+
+    level = DETECTION_UPSAMPLE if upsample is None else upsample
+    boxes = face_models().face_locations(small, number_of_times_to_upsample=level, model=model)
+
+    while upsample is None and boxes and level < MAX_DETECTION_UPSAMPLE:
+        smallest = min(bottom - top for top, _, bottom, _ in boxes)
+        if smallest > 1.5 * MIN_DETECTABLE_FACE / 2 ** level:
+            break
+        level += 1
+        retry = face_models().face_locations(small, number_of_times_to_upsample=level, model=model)
+        if len(retry) <= len(boxes):
+            break
+        boxes = retry
+
+    # Map boxes back onto the original image
+    return [
+        (
+            max(0, int(top / scale)),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(left / scale)),
+        )
+        for top, right, bottom, left in boxes
+    ]
+
+
+def encode_faces(image_np, max_edge=None):
+    """Detects faces on a downscaled copy and encodes them on the original image."""
+    boxes = detect_faces(image_np, max_edge=max_edge)
+    if not boxes:
+        return []
+    return face_models().face_encodings(image_np, known_face_locations=boxes)
+
 
 def get_face_encodings(image_file):
     """Returns a list of encodings from a given image file (for multiple faces)."""
-    image = face_recognition.load_image_file(image_file)
-    encodings = face_recognition.face_encodings(image)
+    image = face_models().load_image_file(image_file)
+    encodings = encode_faces(image)
     return encodings  # could be empty
 
 
-def recognize_faces_from_image(image_file, organization, tolerance=0.4):
+def match_faces_from_image(image_file, organization, tolerance=0.4):
+    """Returns the known employees ({"employee_id", "employee_name"}) found in an image."""
     # Read and convert image
     if isinstance(image_file, bytes):
         image_data = image_file
     else:
         image_data = image_file.read()
 
-    pil_image = Image.open(io.BytesIO(image_data)).convert("RGB")
-    image_np = np.array(pil_image)
+    # A resubmitted photo skips decoding and detection entirely
+    image_key = encoding_cache.key(image_data)
+    unknown_encodings = encoding_cache.get(image_key)
+    if unknown_encodings is None:
+        with span("decode"):
+            pil_image = Image.open(io.BytesIO(image_data)).convert("RGB")
+            image_np = np.array(pil_image)
+
+        # Detect all face encodings in uploaded image
+        with span("detect_encode"):
+            unknown_encodings = encode_faces(image_np)
+        encoding_cache.put(image_key, unknown_encodings)
 
-    # Detect all face encodings in uploaded image
-    unknown_encodings = face_recognition.face_encodings(image_np)
-    if not unknown_encodings:
+    if not len(unknown_encodings):
         return []
 
-    # Load all known encodings for this organization
-    known_employees = list(employees_col.find({"organization": organization}))
-    
-    recognized_names = []
-
-    for unknown_encoding in unknown_encodings:
-        for emp in known_employees:
-            emp_name = emp["employee_name"]
-            emp_encodings = emp.get("face_encodings", [])
-            
-            # Fallback for old entries (single encoding)
-            if "face_encoding" in emp:
-                emp_encodings.append(emp["face_encoding"])
-
-            for known_encoding in emp_encodings:
-                known_encoding_np = np.array(known_encoding)
-                match = face_recognition.compare_faces([known_encoding_np], unknown_encoding, tolerance=tolerance)[0]
-                if match:
-                    recognized_names.append(emp_name)
-                    break  # stop after first match for that person
-
-    return list(set(recognized_names))  # remove duplicates
+    # Faces seen a moment ago reuse their identity; the rest are scored
+    # against the whole gallery at once
+    with span("gallery_fetch"):
+        gallery = get_gallery(organization)
+
+    with span("match"):
+        found = recent_matches.lookup(organization, gallery, unknown_encodings, tolerance)
+        misses = [i for i, emp in enumerate(found) if emp is None]
+        if misses:
+            missed_encodings = [unknown_encodings[i] for i in misses]
+            for i, (emp, _) in zip(misses, gallery.match(missed_encodings, tolerance=tolerance)):
+                found[i] = emp
+            recent_matches.remember(organization, gallery, missed_encodings, [found[i] for i in misses])
+
+    employees = {}
+    for emp in found:
+        if emp is not None:
+            employees[emp["employee_id"]] = emp  # remove duplicates
+
+    return list(employees.values())
+
+
+def recognize_faces_from_image(image_file, organization, tolerance=0.4):
+    return [emp["employee_name"] for emp in match_faces_from_image(image_file, organization, tolerance)]
+
+
+# Enrollment photos must show exactly one face at least this tall (pixels)
+# and at least this sharp (variance of the Laplacian of the face, see face_sharpness)
+MIN_ENROLL_FACE = int(os.getenv("MIN_ENROLL_FACE", "80"))
+MIN_ENROLL_SHARPNESS = float(os.getenv("MIN_ENROLL_SHARPNESS", "40"))
+SHARPNESS_CROP = 128
+
+
+def face_sharpness(image_np, box):
+    """Variance of the Laplacian of a face crop, rescaled to a fixed size so faces of any size compare."""
+    top, right, bottom, left = box
+    crop = Image.fromarray(image_np[top:bottom, left:right]).convert("L").resize((SHARPNESS_CROP, SHARPNESS_CROP), Image.BILINEAR)
+    gray = np.asarray(crop, dtype=np.float32)
+    laplacian = gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1]
+    return float(laplacian.var())
+
+
+def encode_enrollment_face(image_data):
+    """Quality-checks an enrollment photo and encodes its face.
+
+    Faces smaller than MIN_ENROLL_FACE are ignored as background. The photo
+    is rejected unless exactly one face remains and it is sharp enough.
+    Returns (encoding as a list, None) or (None, reason). Top-level so it
+    can run in a worker process.
+    """
+    image = face_models().load_image_file(io.BytesIO(image_data))
+    boxes = detect_faces(image)
+    if not boxes:
+        return None, "no face detected"
+
+    large = [box for box in boxes if box[2] - box[0] >= MIN_ENROLL_FACE]
+    if not large:
+        return None, "face too small"
+    if len(large) > 1:
+        return None, "several faces"
+    if face_sharpness(image, large[0]) < MIN_ENROLL_SHARPNESS:
+        return None, "too blurry"
 
+    encodings = face_models().face_encodings(image, known_face_locations=large)
+    return encodings[0].tolist(), None
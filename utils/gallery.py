@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.encoding_store import unpack_encodings
+from utils.face_index import INDEX_BACKENDS, _sq_distances, build_index
+from utils.metrics import count
+
+ENCODING_DIM = 128
+
+
+def employee_rows(emp):
+    """Returns the stored encodings of an employee document as a (k x 128) matrix."""
+    blocks = []
+
+    # Packed float32/float16 blob (current format)
+    if emp.get("face_encodings_blob") is not None:
+        blocks.append(unpack_encodings(emp["face_encodings_blob"]))
+
+    # Nested lists of doubles (documents not migrated yet)
+    if emp.get("face_encodings"):
+        blocks.append(np.asarray(emp["face_encodings"], dtype=np.float32))
+
+    # Fallback for old entries (single encoding)
+    if "face_encoding" in emp:
+        blocks.append(np.asarray(emp["face_encoding"], dtype=np.float32)[None, :])
+
+    if not blocks:
+        return np.empty((0, ENCODING_DIM), dtype=np.float32)
+    if len(blocks) == 1:
+        return blocks[0]
+    return np.concatenate([b.astype(np.float32, copy=False) for b in blocks])
+
+
+def _employee_centroid(emp, rows):
+    """The stored centroid of an employee (mean of every enrolled encoding), else the mean of its templates."""
+    if emp.get("face_centroid_blob") is not None:
+        return unpack_encodings(emp["face_centroid_blob"])[0].astype(np.float32)
+    return rows.mean(axis=0, dtype=np.float32)
+
+
+class FaceGallery:
+    """All known face encodings of one organization packed into a single matrix.
+
+    Encodings are stored row-wise in a contiguous float32 (N x 128) matrix,
+    grouped by employee, with a parallel array mapping every row back to the
+    employee it belongs to. Nearest-neighbour lookups go through a pluggable
+    index (see utils.face_index), exact brute force by default.
+
+    Every employee also has a centroid. With screen > 0, a lookup first
+    shortlists the `screen` employees with the nearest centroids and then
+    only compares against their templates, instead of searching the index.
+    """
+
+    def __init__(self, encodings, employee_index, employees, index=None, backend="exact", centroids=None, screen=0, **index_params):
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self.employee_index = np.asarray(employee_index, dtype=np.int32)
+        self.employees = employees  # list of {"employee_id", "employee_name"}
+        self.index = index if index is not None else build_index(self.encodings, backend, **index_params)
+        self.screen = screen
+
+        # Rows are grouped by employee: employee i owns rows row_bounds[i]:row_bounds[i + 1]
+        self.row_bounds = np.searchsorted(self.employee_index, np.arange(len(employees) + 1))
+        if centroids is None:
+            centroids = [self.encodings[a:b].mean(axis=0) for a, b in zip(self.row_bounds[:-1], self.row_bounds[1:])]
+        self.centroids = np.asarray(centroids, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+    @classmethod
+    def from_employees(cls, employees, backend="exact", screen=0, **index_params):
+        """Builds a gallery from employee documents as stored in the employees collection."""
+        rows = []
+        employee_index = []
+        members = []
+        centroids = []
+
+        for emp in employees:
+            emp_encodings = employee_rows(emp)
+            if not len(emp_encodings):
+                continue
+
+            idx = len(members)
+            members.append({"employee_id": emp.get("employee_id"), "employee_name": emp["employee_name"]})
+            rows.append(emp_encodings)
+            centroids.append(_employee_centroid(emp, emp_encodings))
+            employee_index.extend([idx] * len(emp_encodings))
+
+        encodings = np.concatenate(rows, dtype=np.float32) if rows else np.empty((0, ENCODING_DIM), dtype=np.float32)
+        return cls(encodings, employee_index, members, backend=backend, centroids=centroids, screen=screen, **index_params)
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def extended(self, employee):
+        """Returns a new gallery that also contains the given employee document.
+
+        The index is extended in place of being rebuilt, so an IVF index keeps
+        its trained centroids. The current gallery is left untouched.
+        """
+        new_rows = employee_rows(employee).astype(np.float32, copy=False)
+        if not len(new_rows):
+            return self
+
+        idx = len(self.employees)
+        return FaceGallery(
+            np.concatenate([self.encodings, new_rows]),
+            np.concatenate([self.employee_index, np.full(len(new_rows), idx, dtype=np.int32)]),
+            self.employees + [{"employee_id": employee.get("employee_id"), "employee_name": employee["employee_name"]}],
+            index=self.index.extended(new_rows),
+            centroids=np.concatenate([self.centroids, _employee_centroid(employee, new_rows)[None, :]]),
+            screen=self.screen,
+        )
+
+    def match(self, unknown_encodings, tolerance=0.4):
+        """Finds the nearest employee for each unknown encoding.
+
+        Returns one (employee, distance) pair per input face, with employee set to
+        None when the nearest employee is farther away than tolerance.
+        """
+        n_faces = len(unknown_encodings)
+        if n_faces == 0:
+            return []
+        if len(self) == 0:
+            return [(None, float("inf"))] * n_faces
+
+        unknown = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if self.screen and len(self.employees) > self.screen:
+            dists, rows = self._screened_search(unknown)
+        else:
+            dists, rows = self.index.search(unknown, k=1)
+
+        # The nearest stored encoding also belongs to the nearest employee
+        return [
+            (self.employees[self.employee_index[r]] if r >= 0 and d <= tolerance else None, float(d))
+            for r, d in zip(rows[:, 0], dists[:, 0])
+        ]
+
+    def _screened_search(self, unknown):
+        """Nearest row per query among the templates of the employees with the closest centroids."""
+        sq = _sq_distances(unknown, self.centroids, self._centroid_sq_norms)
+        shortlist = np.argpartition(sq, self.screen - 1, axis=1)[:, :self.screen].ravel()
+
+        # Every (query, template row) pair to compare, as flat arrays
+        starts = self.row_bounds[shortlist]
+        counts = self.row_bounds[shortlist + 1] - starts
+        pair_query = np.repeat(np.repeat(np.arange(len(unknown)), self.screen), counts)
+        first_pair = np.cumsum(counts) - counts
+        pair_row = np.repeat(starts - first_pair, counts) + np.arange(counts.sum())
+
+        diff = self.encodings[pair_row] - unknown[pair_query]
+        pair_sq = np.einsum("ij,ij->i", diff, diff)
+
+        # Pairs are grouped by query: the nearest one of each group wins
+        order = np.lexsort((pair_sq, pair_query))
+        best = order[np.searchsorted(pair_query[order], np.arange(len(unknown)))]
+        return np.sqrt(pair_sq[best])[:, None], pair_row[best][:, None]
+
+    def save(self, path, version=None):
+        """Writes the gallery and its index to an .npz file, tagged with a change token."""
+        state = {f"index_{key}": value for key, value in self.index.state().items()}
+        # Workers and the app may save the same organization at once: each
+        # writes its own file and the last os.replace wins
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            encodings=self.encodings,
+            employee_index=self.employee_index,
+            employees=np.array(json.dumps(self.employees)),
+            backend=np.array(self.index.kind),
+            centroids=self.centroids,
+            screen=np.array(self.screen),
+            version=np.array(str(version)),
+            **state,
+        )
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Reads a gallery written by save(). Returns (gallery, version)."""
+        with np.load(path, allow_pickle=False) as data:
+            encodings = data["encodings"]
+            state = {key[len("index_"):]: data[key] for key in data.files if key.startswith("index_")}
+            index = INDEX_BACKENDS[str(data["backend"])].from_state(encodings, state)
+            gallery = cls(
+                encodings,
+                data["employee_index"],
+                json.loads(str(data["employees"])),
+                index=index,
+                centroids=data["centroids"] if "centroids" in data.files else None,
+                screen=int(data["screen"]) if "screen" in data.files else 0,
+            )
+            return gallery, str(data["version"])
+
+
+class GalleryCache:
+    """Process-wide LRU/TTL cache of parsed galleries, keyed by organization.
+
+    build(organization, version) returns the FaceGallery of an organization and
+    version(organization) returns a cheap token that changes whenever its
+    employee documents change. A cached gallery is trusted for check_interval seconds,
+    after which its token is compared against the database; it is always
+    reloaded once it is older than ttl seconds. Every stat also goes to the
+    cache_* counters of utils.metrics, labelled with name.
+    """
+
+    def __init__(self, build, version, max_entries=32, ttl=300, check_interval=5, clock=time.monotonic,
+                 name="gallery"):
+        self._build = build
+        self.name = name
+        self._version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._clock = clock
+        self._entries = OrderedDict()  # organization -> _CacheEntry
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate() so in-flight loads are not cached
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, organization):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(organization)
+            if entry is not None and now - entry.loaded_at > self.ttl:
+                entry = None
+                self._count("stale")
+
+        if entry is not None and now - entry.checked_at > self.check_interval:
+            if self._version(organization) == entry.version:
+                entry.checked_at = now
+            else:
+                entry = None
+                with self._lock:
+                    self._count("stale")
+
+        if entry is not None:
+            with self._lock:
+                self._entries.move_to_end(organization)
+                self._count("hits")
+            return entry.gallery
+
+        # Read the version first so a write racing with the load only causes an extra reload
+        generation = self._generation
+        version = self._version(organization)
+        gallery = self._build(organization, version)
+
+        with self._lock:
+            self._count("misses")
+            if generation == self._generation:
+                self._store(organization, _CacheEntry(gallery, version, now))
+
+        return gallery
+
+    def peek(self, organization):
+        """Returns (gallery, version) from the cache without loading or validating it."""
+        with self._lock:
+            entry = self._entries.get(organization)
+            return (entry.gallery, entry.version) if entry is not None else (None, None)
+
+    def replace(self, organization, gallery, version):
+        """Stores an updated gallery, e.g. one extended with a newly inserted employee."""
+        with self._lock:
+            self._generation += 1
+            self._store(organization, _CacheEntry(gallery, version, self._clock()))
+
+    def _store(self, organization, entry):
+        self._entries[organization] = entry
+        self._entries.move_to_end(organization)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._count("evictions")
+
+    def invalidate(self, organization=None):
+        """Drops the cached gallery of one organization, or of all of them."""
+        with self._lock:
+            if organization is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(organization, None)
+            self._generation += 1
+            self._count("invalidations")
+
+    def _count(self, stat):
+        # Called under the lock
+        self.stats[stat] += 1
+        count(f"cache_{stat}", cache=self.name)
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+class _CacheEntry:
+    __slots__ = ("gallery", "version", "loaded_at", "checked_at")
+
+    def __init__(self, gallery, version, loaded_at):
+        self.gallery = gallery
+        self.version = version
+        self.loaded_at = loaded_at
+        self.checked_at = loaded_at
@@ -0,0 +1,249 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from resources import shared
+from utils.background import BackgroundLoop
+from utils.metrics import span
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", ".image_store")
+
+# Where stored images are copied in the background: "cloudinary", "local"
+# (the IMAGE_REMOTE_DIR directory; for development and tests) or "none"
+IMAGE_REMOTE = os.getenv("IMAGE_REMOTE", "cloudinary")
+IMAGE_REMOTE_DIR = os.getenv("IMAGE_REMOTE_DIR", ".image_remote")
+
+# Retry backoff of failed remote copies, in seconds (doubles per attempt)
+SYNC_BASE_DELAY = 5.0
+SYNC_MAX_DELAY = 600.0
+SYNC_WORKERS = int(os.getenv("IMAGE_SYNC_WORKERS", "4"))  # uploads in flight at once
+
+
+class LocalImageStore:
+    """Content-addressed image files on local disk.
+
+    An image's key is the SHA-256 of its bytes, so storing the same photo
+    again writes nothing. Layout under root: objects/<ab>/<key> holds the
+    images, synced/<key> the remote URL of the ones already copied.
+    """
+
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "synced"), exist_ok=True)
+
+    @staticmethod
+    def key_for(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, "objects", key[:2], key)
+
+    def put(self, data):
+        """Stores image bytes durably. Returns their key."""
+        key = self.key_for(data)
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)  # readers never see a partial file
+        return key
+
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def remote_url(self, key):
+        """URL of the remote copy, or None while it isn't synced yet."""
+        try:
+            with open(os.path.join(self.root, "synced", key)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set_remote_url(self, key, url):
+        with open(os.path.join(self.root, "synced", key), "w") as f:
+            f.write(url)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        """Removes a stored image (and its remote URL record) if present."""
+        for path in (self.path(key), os.path.join(self.root, "synced", key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class CloudinaryRemote:
+    def upload(self, key, data):
+        from cloud import upload_image_to_cloudinary
+
+        # The content hash as public_id: a retried upload can't create a second copy
+        url = upload_image_to_cloudinary(io.BytesIO(data), None, public_id=key)
+        if url is None:
+            raise IOError("Cloudinary upload failed")
+        return url
+
+
+class LocalRemote:
+    """Stand-in remote that copies images into a directory.
+
+    latency (seconds per upload) and failures (how many of the next
+    uploads raise) simulate a slow or flaky network.
+    """
+
+    def __init__(self, root=IMAGE_REMOTE_DIR, latency=0.0, failures=0):
+        self.root = root
+        self.latency = latency
+        self.failures = failures
+        os.makedirs(root, exist_ok=True)
+
+    def upload(self, key, data):
+        time.sleep(self.latency)
+        if self.failures > 0:
+            self.failures -= 1
+            raise IOError("simulated upload failure")
+        path = os.path.join(self.root, key)
+        with open(path, "wb") as f:
+            f.write(data)
+        return f"file://{os.path.abspath(path)}"
+
+
+class RemoteSync(BackgroundLoop):
+    """Write-behind copy of stored images to a remote backend.
+
+    enqueue() only writes a small journal entry under <store root>/pending;
+    a background thread uploads pending images and retries failures with
+    exponential backoff. The journal survives restarts, so nothing queued
+    is lost. on_synced(key, url, meta) runs once per enqueue() after the
+    image is copied (right away when it already was); if it raises, it is
+    retried without uploading again.
+    """
+
+    label = "Image Sync"
+
+    def __init__(self, store, remote, on_synced=None, base_delay=SYNC_BASE_DELAY, max_delay=SYNC_MAX_DELAY,
+                 workers=SYNC_WORKERS, clock=time.time):
+        super().__init__()
+        self.store = store
+        self.remote = remote
+        self.on_synced = on_synced or (lambda key, url, meta: None)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.stats = {"uploaded": 0, "deduplicated": 0, "failed_attempts": 0}
+        self._dir = os.path.join(store.root, "pending")
+        self._lock = threading.Lock()
+        self._uploads = ThreadPoolExecutor(workers, thread_name_prefix="image-sync-upload")
+        os.makedirs(self._dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self._dir, f"{key}.json")
+
+    def _read(self, key):
+        try:
+            with open(self._entry_path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, entry):
+        path = self._entry_path(entry["key"])
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(f"{path}.tmp", path)
+
+    def enqueue(self, key, meta=None):
+        """Queues a stored image for the remote; meta is passed back to on_synced."""
+        with self._lock:
+            entry = self._read(key) or {"key": key, "metas": [], "attempts": 0, "next_try": 0, "error": None}
+            entry["metas"].append(meta)
+            entry["next_try"] = 0
+            self._write(entry)
+        self.wake()
+
+    def pending(self):
+        return sorted(name[:-len(".json")] for name in os.listdir(self._dir) if name.endswith(".json"))
+
+    def run_once(self):
+        """Processes every entry that is due. Returns the number still pending."""
+        now = self.clock()
+        due = []
+        with self._lock:
+            for key in self.pending():
+                entry = self._read(key)
+                if entry is not None and entry["next_try"] <= now:
+                    due.append(entry)
+        list(self._uploads.map(self._sync, due))
+        return len(self.pending())
+
+    def _sync(self, entry):
+        key = entry["key"]
+        try:
+            url = self.store.remote_url(key)
+            if url is None:
+                with span("image_sync"):
+                    url = self.remote.upload(key, self.store.get(key))
+                self.store.set_remote_url(key, url)
+                self._count("uploaded")
+            else:
+                self._count("deduplicated")
+            for meta in entry["metas"]:
+                self.on_synced(key, url, meta)
+        except Exception as e:
+            with self._lock:
+                self.stats["failed_attempts"] += 1
+                current = self._read(key) or entry
+                current["attempts"] += 1
+                current["error"] = str(e)
+                current["next_try"] = self.clock() + min(self.max_delay, self.base_delay * 2 ** (current["attempts"] - 1))
+                self._write(current)
+            print(f"[Image Sync Error] {key[:12]}: {e} (attempt {current['attempts']})")
+            return
+
+        with self._lock:
+            # Entries enqueued again while this upload ran keep their new metas
+            current = self._read(key)
+            if current is not None and len(current["metas"]) > len(entry["metas"]):
+                current["metas"] = current["metas"][len(entry["metas"]):]
+                current["next_try"] = 0
+                self._write(current)
+            else:
+                os.remove(self._entry_path(key))
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def step(self):
+        self.run_once()
+        return False  # entries still pending are waiting on their backoff
+
+    def stop(self, timeout=5):
+        super().stop(timeout)
+        self._uploads.shutdown(wait=False)
+
+
+def make_remote(kind=IMAGE_REMOTE):
+    if kind == "cloudinary":
+        return CloudinaryRemote()
+    if kind == "local":
+        return LocalRemote(IMAGE_REMOTE_DIR)
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown IMAGE_REMOTE {kind!r}")
+
+
+def get_image_store():
+    return shared("image_store", lambda: LocalImageStore(IMAGE_STORE_DIR))
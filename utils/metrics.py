@@ -0,0 +1,276 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every process (app and recognition workers) dumps its metrics here so the
+# endpoint can merge them; unset keeps metrics in-process only
+METRICS_DIR = os.getenv("METRICS_DIR")
+DUMP_INTERVAL = 5.0
+
+# Requests slower than this many milliseconds get their sampled stacks saved; 0 disables profiling
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL = 0.005
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+def series_name(name, labels):
+    """e.g. cache_hits{cache="gallery"}: how a counter or gauge is keyed in snapshots."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Registry:
+    """Per-stage latency histograms, counters and gauges of this process."""
+
+    def __init__(self):
+        self._histograms = {}  # stage -> Histogram
+        self._counters = {}    # series -> count
+        self._gauges = {}      # series -> function returning the current value
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = Histogram()
+            hist.observe(seconds)
+            due = self._claim_dump()
+        if due:
+            self._dump_quietly()
+
+    def inc(self, name, n=1, **labels):
+        """Adds n to a counter."""
+        series = series_name(name, labels)
+        with self._lock:
+            self._counters[series] = self._counters.get(series, 0) + n
+            due = self._claim_dump()
+        if due:
+            self._dump_quietly()
+
+    def gauge(self, name, read, **labels):
+        """Registers read() as a gauge's value; it is called on every snapshot."""
+        with self._lock:
+            self._gauges[series_name(name, labels)] = read
+
+    def _claim_dump(self):
+        # Called under the lock: one thread dumps per interval
+        if METRICS_DIR and time.monotonic() - self._last_dump > DUMP_INTERVAL:
+            self._last_dump = time.monotonic()
+            return True
+        return False
+
+    def _dump_quietly(self):
+        try:
+            self.dump()
+        except Exception as e:
+            print(f"[Metrics Error]: {e}")
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {
+                stage: {"counts": list(h.counts), "sum": h.sum, "count": h.count}
+                for stage, h in self._histograms.items()
+            }
+            counters = dict(self._counters)
+            readers = dict(self._gauges)
+
+        gauges = {}
+        for series, read in readers.items():
+            try:
+                gauges[series] = read()
+            except Exception as e:
+                print(f"[Metrics Error] {series}: {e}")
+        return {"histograms": histograms, "counters": counters, "gauges": gauges}
+
+    def dump(self, directory=None):
+        """Writes this process's snapshot to <directory>/metrics-<pid>.json."""
+        directory = directory or METRICS_DIR
+        self._last_dump = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"  # dump() may also be called directly, from any thread
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+@contextmanager
+def span(stage):
+    """Times the enclosed block into the `stage` histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Metrics must never fail the code being timed
+        try:
+            registry.observe(stage, time.perf_counter() - start)
+        except Exception as e:
+            print(f"[Metrics Error]: {e}")
+
+
+def count(name, n=1, **labels):
+    """Adds n to the `name` counter; like span(), never fails the caller."""
+    try:
+        registry.inc(name, n, **labels)
+    except Exception as e:
+        print(f"[Metrics Error]: {e}")
+
+
+def gauge(name, read, **labels):
+    """Reports read() as the `name` gauge."""
+    registry.gauge(name, read, **labels)
+
+
+def collect():
+    """This process's metrics merged with the dumps of every other process in METRICS_DIR.
+
+    Histograms and counters add up. Gauges report a level shared by the
+    processes (e.g. a queue file's backlog), so the highest reading wins.
+    """
+    merged = registry.snapshot()
+    paths = glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")) if METRICS_DIR else []
+    own = f"metrics-{os.getpid()}.json"
+
+    for path in paths:
+        if os.path.basename(path) == own:
+            continue
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for stage, hist in snapshot.get("histograms", {}).items():
+            into = merged["histograms"].setdefault(stage, {"counts": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+            into["counts"] = [a + b for a, b in zip(into["counts"], hist["counts"])]
+            into["sum"] += hist["sum"]
+            into["count"] += hist["count"]
+        for series, value in snapshot.get("counters", {}).items():
+            merged["counters"][series] = merged["counters"].get(series, 0) + value
+        for series, value in snapshot.get("gauges", {}).items():
+            merged["gauges"][series] = max(value, merged["gauges"].get(series, value))
+
+    return merged
+
+
+def render_prometheus(snapshot=None):
+    """Prometheus text exposition of the stage histograms, counters (fra_<name>_total) and gauges (fra_<name>)."""
+    snapshot = collect() if snapshot is None else snapshot
+    histograms = snapshot["histograms"]
+    lines = [
+        "# HELP fra_stage_seconds Time spent per pipeline stage.",
+        "# TYPE fra_stage_seconds histogram",
+    ]
+    for stage in sorted(histograms):
+        hist = histograms[stage]
+        cumulative = 0
+        for bound, count in zip(list(BUCKETS) + ["+Inf"], hist["counts"]):
+            cumulative += count
+            lines.append(f'fra_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'fra_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]}')
+        lines.append(f'fra_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+    for kind, suffix in (("counters", "_total"), ("gauges", "")):
+        typed = set()
+        for series in sorted(snapshot[kind]):
+            name, _, labels = series.partition("{")
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE fra_{name}{suffix} {kind[:-1]}")
+            lines.append(f"fra_{name}{suffix}{'{' + labels if labels else ''} {snapshot[kind][series]}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port):
+    """Serves /metrics on the given port from a daemon thread."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+@contextmanager
+def profile_if_slow(name, threshold_ms=None):
+    """Samples the current thread's stack while the block runs.
+
+    If the block takes longer than threshold_ms, the samples are written in
+    collapsed-stack format (one "frame;frame;frame count" line per stack,
+    ready for flamegraph tools) to METRICS_DIR/profiles. A threshold of 0
+    disables the sampler entirely.
+    """
+    threshold_ms = PROFILE_SLOW_MS if threshold_ms is None else threshold_ms
+    if not threshold_ms:
+        yield
+        return
+
+    target = threading.get_ident()
+    stacks = Counter()
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(PROFILE_INTERVAL):
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stacks[";".join(reversed(stack))] += 1
+
+    sampler = threading.Thread(target=sample, name="slow-request-profiler", daemon=True)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > threshold_ms and stacks:
+            directory = os.path.join(METRICS_DIR or ".", "profiles")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}-{int(time.time() * 1000)}-{elapsed_ms:.0f}ms.txt")
+            with open(path, "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,151 @@
+import hashlib
+import threading
+import time
+
+import numpy as np
+from cachetools import TTLCache
+
+from utils.metrics import count
+
+
+class EncodingCache:
+    """Maps the hash of an image's bytes to the face encodings detected in it.
+
+    Encodings only depend on the image, never on a gallery, so entries stay
+    valid when employees change; identities are always resolved afterwards.
+    Hits, misses and evictions also go to the cache_* counters of
+    utils.metrics, labelled with name.
+    """
+
+    def __init__(self, max_entries=256, ttl=600, name="encodings"):
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.name = name
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(image_data):
+        return hashlib.sha256(image_data).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            encodings = self._cache.get(key)
+            self._count("hits" if encodings is not None else "misses")
+            return encodings
+
+    def put(self, key, encodings):
+        with self._lock:
+            self._cache.expire()
+            if key not in self._cache and len(self._cache) >= self._cache.maxsize:
+                self._count("evictions")
+            self._cache[key] = encodings
+
+    def _count(self, stat, n=1):
+        self.stats[stat] += n
+        count(f"cache_{stat}", n, cache=self.name)
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+class RecentMatchCache:
+    """Remembers encodings matched in the last few seconds, per organization.
+
+    A new encoding within radius (or the caller's tolerance, if stricter)
+    of one of them is given the same identity without scanning the
+    gallery. Entries belong to the gallery they were matched against and
+    are dropped as soon as that gallery is replaced. Counts go to
+    utils.metrics like EncodingCache's.
+    """
+
+    def __init__(self, radius=0.25, ttl=30, max_per_org=256, max_orgs=64, clock=time.monotonic,
+                 name="recent_matches"):
+        self.radius = radius
+        self.name = name
+        self.ttl = ttl
+        self.max_per_org = max_per_org
+        self._clock = clock
+        self._orgs = TTLCache(maxsize=max_orgs, ttl=ttl)  # organization -> _RecentMatches
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def lookup(self, organization, gallery, encodings, tolerance=None):
+        """Returns one employee (or None on a miss) per encoding."""
+        radius = self.radius if tolerance is None else min(self.radius, tolerance)
+        with self._lock:
+            recent = self._orgs.get(organization)
+            if recent is not None and recent.gallery is not gallery:
+                del self._orgs[organization]
+                recent = None
+                self._count("invalidations")
+
+            if recent is None or not encodings:
+                self._count("misses", len(encodings))
+                return [None] * len(encodings)
+
+            recent.expire(self._clock() - self.ttl)
+            found = recent.nearest(np.asarray(encodings, dtype=np.float32), radius)
+            hits = sum(emp is not None for emp in found)
+            self._count("hits", hits)
+            self._count("misses", len(found) - hits)
+            return found
+
+    def remember(self, organization, gallery, encodings, employees):
+        """Stores freshly matched (encoding, employee) pairs; unmatched faces are ignored."""
+        pairs = [(enc, emp) for enc, emp in zip(encodings, employees) if emp is not None]
+        if not pairs:
+            return
+        with self._lock:
+            recent = self._orgs.get(organization)
+            if recent is None or recent.gallery is not gallery:
+                recent = _RecentMatches(gallery)
+            recent.add(pairs, self._clock(), self.max_per_org)
+            self._orgs.expire()
+            if organization not in self._orgs and len(self._orgs) >= self._orgs.maxsize:
+                self._count("evictions")
+            self._orgs[organization] = recent  # also refreshes the organization's TTL
+
+    def invalidate(self, organization=None):
+        with self._lock:
+            if organization is None:
+                self._orgs.clear()
+            else:
+                self._orgs.pop(organization, None)
+            self._count("invalidations")
+
+    def _count(self, stat, n=1):
+        self.stats[stat] += n
+        count(f"cache_{stat}", n, cache=self.name)
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+class _RecentMatches:
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self.encodings = np.empty((0, 128), dtype=np.float32)
+        self.employees = []
+        self.times = np.empty(0)
+
+    def add(self, pairs, now, limit):
+        new = np.asarray([enc for enc, _ in pairs], dtype=np.float32).reshape(-1, 128)
+        self.encodings = np.concatenate([self.encodings, new])[-limit:]
+        self.employees = (self.employees + [emp for _, emp in pairs])[-limit:]
+        self.times = np.concatenate([self.times, np.full(len(new), now)])[-limit:]
+
+    def expire(self, cutoff):
+        keep = self.times >= cutoff
+        if not keep.all():
+            self.encodings = self.encodings[keep]
+            self.employees = [emp for emp, k in zip(self.employees, keep) if k]
+            self.times = self.times[keep]
+
+    def nearest(self, encodings, radius):
+        if not len(self.employees):
+            return [None] * len(encodings)
+        dists = np.linalg.norm(encodings[:, None, :] - self.encodings[None, :, :], axis=2)
+        best = dists.argmin(axis=1)
+        return [self.employees[b] if dists[i, b] <= radius else None for i, b in enumerate(best)]
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from resources import replace_shared, shared
+
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", "0")) or None  # None = one per CPU
+RECOGNITION_MAX_PENDING = int(os.getenv("RECOGNITION_MAX_PENDING", "16"))
+RECOGNITION_TIMEOUT = float(os.getenv("RECOGNITION_TIMEOUT", "30"))
+
+
+class WorkerBusy(Exception):
+    """Raised when too many recognition jobs are already queued."""
+
+
+def _warm_up():
+    # Load dlib's models once per worker instead of on the first job. Nothing
+    # here may fail on a Mongo outage: an initializer that raises breaks the
+    # whole pool. The gallery fetch opens the connection on the first job.
+    from resources import face_models
+    import utils.face_utils  # noqa: F401
+
+    face_models()
+
+
+def _recognize(image_data, organization, tolerance):
+    # Runs inside a worker; the per-organization gallery cache lives in the
+    # worker process and stays warm between jobs
+    from utils.face_utils import match_faces_from_image
+    from utils.metrics import profile_if_slow, span
+
+    with profile_if_slow("recognition"), span("recognition"):
+        return match_faces_from_image(image_data, organization, tolerance)
+
+
+def _warm_up_worker(barrier, image_data, organization):
+    # Holding every job until all workers have one gives each worker exactly one
+    try:
+        if image_data is not None:
+            _recognize(image_data, organization, 0.4)
+    finally:
+        barrier.wait()
+    return os.getpid()
+
+
+class RecognitionPool:
+    """Runs face recognition in a pool of worker processes.
+
+    At most max_pending jobs are queued or running at once; submit() raises
+    WorkerBusy beyond that instead of letting callers pile up. Each worker
+    keeps its own gallery cache, which notices new employees through the
+    cache's version check.
+    """
+
+    def __init__(self, workers=RECOGNITION_WORKERS, max_pending=RECOGNITION_MAX_PENDING, timeout=RECOGNITION_TIMEOUT):
+        # spawn: workers must not inherit the parent's MongoClient or server threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up,
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.timeout = timeout
+        self.workers = workers or os.cpu_count()
+
+    def submit(self, image_data, organization, tolerance=0.4):
+        """Queues a recognition job. Returns a Future of the matched employees."""
+        if not self._slots.acquire(blocking=False):
+            raise WorkerBusy("Too many recognition jobs in progress")
+        try:
+            future = self._executor.submit(_recognize, image_data, organization, tolerance)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def wait(self, future, timeout=None, poll_interval=0.05):
+        """Polls a submitted job until it finishes. Raises TimeoutError when it takes too long."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while not future.done():
+            if time.monotonic() > deadline:
+                future.cancel()  # only succeeds if the job has not started yet
+                raise TimeoutError("Recognition timed out")
+            time.sleep(poll_interval)
+        return future.result()
+
+    def recognize(self, image_data, organization, tolerance=0.4, timeout=None):
+        return self.wait(self.submit(image_data, organization, tolerance), timeout)
+
+    def warm_up(self, image_data=None, organization=None, wait=False, timeout=120):
+        """Starts the worker processes (each loads the face models) ahead of the first job.
+
+        With wait=True, blocks until every worker is up and, given an image,
+        has recognized it once (which also loads the organization's gallery),
+        and returns the worker pids.
+        """
+        if not wait:
+            for _ in range(self.workers):
+                self._executor.submit(os.getpid)
+            return
+
+        with multiprocessing.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(self.workers, timeout=timeout)
+            jobs = [self._executor.submit(_warm_up_worker, barrier, image_data, organization) for _ in range(self.workers)]
+            return sorted(job.result(timeout) for job in jobs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def get_recognition_pool():
+    return shared("recognition_pool", RecognitionPool)
+
+
+def replace_broken_pool(pool):
+    """Swaps a pool broken by a dead worker (OOM, a crash in dlib) for a new one. Returns the new pool."""
+    print("[Recognition Pool Error]: a worker died, starting a new pool")
+    new_pool = replace_shared("recognition_pool", pool, RecognitionPool)
+    if new_pool is not pool:
+        pool.shutdown(wait=False)
+    return new_pool
+
+
+def recognize(image_data, organization, tolerance=0.4, timeout=None):
+    """Recognizes faces in the shared pool; a broken pool is replaced and the job retried once.
+
+    Raises WorkerBusy, TimeoutError, or BrokenProcessPool if the new pool breaks too.
+    """
+    pool = get_recognition_pool()
+    try:
+        return pool.recognize(image_data, organization, tolerance, timeout)
+    except BrokenProcessPool:
+        return replace_broken_pool(pool).recognize(image_data, organization, tolerance, timeout)
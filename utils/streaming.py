@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from resources import face_models
+from utils.attendance import TIMEZONE, AttendanceDebouncer
+from utils.face_utils import detect_faces, get_gallery
+
+
+def video_frames(source):
+    """Yields RGB frames from a video file path or a camera index. Needs opencv-python."""
+    try:
+        import cv2
+    except ImportError as e:
+        raise ImportError("Reading video needs opencv-python (pip install opencv-python-headless)") from e
+
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source {source!r}")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    union = area(a) + area(b) - inter
+    return inter / union if union else 0.0
+
+
+class FaceTrack:
+    __slots__ = ("track_id", "box", "employee", "missed", "attempts", "last_attempt")
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.employee = None
+        self.missed = 0
+        self.attempts = 0         # times the face was encoded and matched
+        self.last_attempt = None  # detection number of the latest attempt
+
+
+class FaceTracker:
+    """Associates face boxes across detections by overlap.
+
+    A track keeps its box (and identity) between detection frames and is
+    dropped once it has been missing from max_missed detections in a row,
+    i.e. when the person has left the frame.
+    """
+
+    def __init__(self, min_iou=0.3, max_missed=2):
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 0
+
+    def update(self, boxes):
+        """Matches new detections to tracks. Returns the tracks created for unmatched boxes."""
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True,
+        )
+        used_tracks, used_boxes = set(), set()
+        for iou, t, b in pairs:
+            if iou < self.min_iou:
+                break
+            if t in used_tracks or b in used_boxes:
+                continue
+            used_tracks.add(t)
+            used_boxes.add(b)
+            self.tracks[t].box = boxes[b]
+            self.tracks[t].missed = 0
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        new_tracks = []
+        for b, box in enumerate(boxes):
+            if b not in used_boxes:
+                track = FaceTrack(self._next_id, box)
+                self._next_id += 1
+                new_tracks.append(track)
+        self.tracks.extend(new_tracks)
+        return new_tracks
+
+
+class StreamingRecognizer:
+    """Recognizes people in a continuous stream of frames.
+
+    Faces are detected every detect_every frames; the frames in between
+    are skipped, not tracked. Tracks are carried from one detection to the
+    next by box overlap, so a face has to stay roughly in place over
+    detect_every frames to keep its track. A face is encoded and matched
+    when its track starts; the identity then stays with the track until
+    the person leaves the frame. A track that
+    didn't match (far away, blurred, head turned) is tried again every
+    retry_every detections, at most max_attempts times in all.
+    """
+
+    def __init__(self, organization, detect_every=5, tolerance=0.4, max_edge=640, cooldown=timedelta(minutes=1), clock=None,
+                 retry_every=3, max_attempts=5):
+        self.organization = organization
+        self.detect_every = detect_every
+        self.retry_every = retry_every
+        self.max_attempts = max_attempts
+        self.tolerance = tolerance
+        self.max_edge = max_edge
+        self.tracker = FaceTracker()
+        self.debouncer = AttendanceDebouncer(cooldown)
+        self.clock = clock or (lambda: datetime.now(TIMEZONE))
+        self.stats = {"frames": 0, "detections": 0, "encodings": 0, "events": 0}
+
+    def process(self, frame):
+        """Feeds one RGB frame. Returns the (employee, time) attendance events it produced."""
+        index = self.stats["frames"]
+        self.stats["frames"] += 1
+        if index % self.detect_every:
+            return []
+
+        detection = self.stats["detections"]
+        self.stats["detections"] += 1
+        self.tracker.update(detect_faces(frame, max_edge=self.max_edge))
+
+        # Faces that just entered the frame, and visible unidentified ones due for another try
+        pending = [
+            track for track in self.tracker.tracks
+            if track.employee is None and track.missed == 0 and track.attempts < self.max_attempts
+            and (track.last_attempt is None or detection - track.last_attempt >= self.retry_every)
+        ]
+        if not pending:
+            return []
+
+        encodings = face_models().face_encodings(frame, known_face_locations=[t.box for t in pending])
+        self.stats["encodings"] += len(encodings)
+        matches = get_gallery(self.organization).match(np.asarray(encodings), tolerance=self.tolerance)
+
+        events = []
+        now = self.clock()
+        for track, (employee, _) in zip(pending, matches):
+            track.attempts += 1
+            track.last_attempt = detection
+            track.employee = employee
+            if employee is not None and self.debouncer.seen(employee, now):
+                events.append((employee, now))
+        self.stats["events"] += len(events)
+        return events
+
+    def run(self, frames):
+        """Processes a whole frame source, yielding attendance events as they happen."""
+        for frame in frames:
+            yield from self.process(frame)
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+
+# Templates kept per employee, and the distance under which two encodings
+# count as near-duplicates of each other
+MAX_TEMPLATES = int(os.getenv("MAX_TEMPLATES", "5"))
+MERGE_RADIUS = float(os.getenv("TEMPLATE_MERGE_RADIUS", "0.15"))
+
+
+def consolidate(encodings, max_templates=MAX_TEMPLATES, merge_radius=MERGE_RADIUS):
+    """Reduces an employee's encodings to at most max_templates representatives.
+
+    Near-duplicates (closer than merge_radius) are grouped first, then the
+    two groups whose means are closest are merged (centroid linkage) until
+    max_templates are left. Each group
+    is represented by its medoid, a real encoding, rather than by an
+    average that no photo produced. Returns (templates, centroid) where
+    centroid is the mean of every input encoding.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    if not len(encodings):
+        return encodings, None
+    centroid = encodings.mean(axis=0)
+
+    # Leader clustering: encodings closest to the centroid lead their groups
+    order = np.argsort(np.linalg.norm(encodings - centroid, axis=1))
+    groups = []  # lists of row numbers
+    leaders = []
+    for i in order:
+        if leaders:
+            dists = np.linalg.norm(encodings[leaders] - encodings[i], axis=1)
+            nearest = int(np.argmin(dists))
+            if dists[nearest] < merge_radius:
+                groups[nearest].append(i)
+                continue
+        leaders.append(i)
+        groups.append([i])
+
+    # Centroid-linkage merging: a merged group's mean is the size-weighted mean of both
+    means = [encodings[g].mean(axis=0) for g in groups]
+    while len(groups) > max_templates:
+        stacked = np.stack(means)
+        dists = np.linalg.norm(stacked[:, None, :] - stacked[None, :, :], axis=2)
+        np.fill_diagonal(dists, np.inf)
+        a, b = sorted(np.unravel_index(int(np.argmin(dists)), dists.shape))
+        size_a, size_b = len(groups[a]), len(groups[b])
+        means[a] = (means[a] * size_a + means[b] * size_b) / (size_a + size_b)
+        groups[a].extend(groups.pop(b))
+        means.pop(b)
+
+    medoids = [g[int(np.argmin(np.linalg.norm(encodings[g] - mean, axis=1)))] for g, mean in zip(groups, means)]
+    return encodings[medoids], centroid